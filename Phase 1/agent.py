@@ -1,124 +1,435 @@
 """Fixed SQL Agent implementation for ChatBot"""
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Tuple
+import re
+import threading
+from typing import AsyncIterator, Iterator, List, Dict, Tuple
+import streamlit as st
 from langchain_groq import ChatGroq
 from langchain_community.utilities import SQLDatabase
+from langchain_core.agents import AgentAction
 from langchain.agents import AgentExecutor, create_tool_calling_agent
-from config import Config
-from database import DatabaseDetector
+from cache_store import load_answers, save_answer
+from config import get_config
+from database import build_schema_index, detect_db_type, get_db_guidance
 from prompts import PromptTemplates
-from tools import SQLExecutor, create_sql_tool, QueryLogger
+from tools import (SQLExecutor, create_sql_tool, create_sql_batch_tool,
+                   create_schema_tool, QueryLogger)
 
 logger = logging.getLogger(__name__)
 
+# Strip punctuation and collapse whitespace when keying the answer cache,
+# so trivially rephrased questions ("List customers!" / "list customers")
+# share an entry without any embedding machinery
+_QUESTION_NORM_RE = re.compile(r"[^\w\s]+")
+
+def _normalize_question(question: str) -> str:
+    """Canonical cache key for a user question"""
+    return " ".join(_QUESTION_NORM_RE.sub(" ", question.lower()).split())
+
+# Above this many tables the full DDL dump is dropped from the system
+# prompt (it grows linearly with schema width and every question pays for
+# it); the agent fetches per-table DDL through describe_tables instead
+_SCHEMA_PRUNE_THRESHOLD = 20
+
+# Rough prompt budget for the schema block, in tokens (~4 chars/token).
+# A dump past this risks blowing the model's context window mid-request,
+# so such schemas also fall back to the table-list prompt even with few
+# tables (e.g. very wide ones)
+_SCHEMA_TOKEN_BUDGET = 6000
+
+def _estimate_tokens(text: str) -> int:
+    """Cheap token estimate; close enough for a context-window guard"""
+    return len(text) // 4
+
+# AgentExecutor's early-stop output ("Agent stopped due to max
+# iterations." / "...iteration limit or time limit.") is a transient
+# failure, not an answer — never worth caching
+_EARLY_STOP_PREFIX = "Agent stopped due to"
+
+@st.cache_resource
+def get_llm(api_key: str, model: str) -> ChatGroq:
+    """Build (or reuse) the ChatGroq client for a given key/model pair.
+
+    Streamlit reruns the script on every interaction, so constructing the
+    client inline would rebuild its HTTP connection pool each time. Caching
+    as a resource keeps one client (and its open connections) per
+    (api_key, model) across reruns and sessions.
+    """
+    return ChatGroq(
+        api_key=api_key,
+        model=model,
+        temperature=0,
+        max_tokens=None,
+        timeout=30,
+        max_retries=2,
+    )
+
+@st.cache_resource(show_spinner=False)
+def _stream_loop() -> asyncio.AbstractEventLoop:
+    """Long-lived event loop (on a daemon thread) for the streaming bridge.
+
+    The cached ChatGroq client's async HTTP transport binds its keep-alive
+    connections to the loop they were opened on, so driving each streamed
+    question on a fresh loop and closing it broke every subsequent one
+    with "Event loop is closed". One persistent loop shared by all
+    streaming turns keeps those connections valid for the process lifetime.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="sql-agent-stream-loop",
+                     daemon=True).start()
+    return loop
+
+@st.cache_data(ttl=3600, max_entries=8, show_spinner=False)
+def load_schema(db_url: str, _db: SQLDatabase) -> str:
+    """Fetch table info for a connection, cached by its URL.
+
+    `get_table_info()` issues metadata queries (information_schema /
+    sqlite_master / pg_tables) which are expensive on wide schemas, and
+    Streamlit re-instantiates SQLAgent on reruns. The leading-underscore
+    `_db` parameter is excluded from hashing; the rendered URL (password
+    hidden) is the cache key.
+    """
+    return _db.get_table_info()
+
+@st.cache_resource(show_spinner=False)
+def build_executor(db_url: str, model: str, schema_key: str, db_type: str,
+                   _llm: ChatGroq, _db: SQLDatabase,
+                   _schema: str) -> Tuple[AgentExecutor, SQLExecutor, Dict]:
+    """Build (or reuse) the agent executor for a connection.
+
+    Creating a tool-calling agent involves tool-schema derivation and
+    template compilation, and SQLAgent is re-instantiated on Streamlit
+    reruns. Keyed by (db_url, model, schema digest, db_type); the LLM,
+    database and schema string are passed as unhashed underscore args.
+    Also returns the answer cache for this connection, so memoized
+    responses survive reruns alongside the executor.
+    """
+    sql_executor = SQLExecutor(_db, db_type)
+
+    # Create the tools list; the batch tool lets one LLM step run several
+    # independent queries over a shared connection
+    sql_tool = create_sql_tool(sql_executor)
+    batch_tool = create_sql_batch_tool(sql_executor)
+    tools = [sql_tool, batch_tool]
+
+    # Wide schemas: keep the prompt to the table list and let the agent
+    # pull per-table DDL on demand, instead of every question carrying the
+    # full dump in input tokens
+    prompt_schema = _schema
+    schema_index = build_schema_index(_schema)
+    if (len(schema_index) > _SCHEMA_PRUNE_THRESHOLD
+            or _estimate_tokens(_schema) > _SCHEMA_TOKEN_BUDGET):
+        tools.append(create_schema_tool(schema_index))
+        prompt_schema = (
+            "Tables (call describe_tables for column details before "
+            "querying): " + ", ".join(schema_index)
+        )
+        logger.info(
+            "Schema has %d tables / ~%d tokens; injecting table list only",
+            len(schema_index), _estimate_tokens(_schema)
+        )
+
+    # Get database-specific guidance
+    db_guidance = get_db_guidance(db_type)
+
+    # Create the prompt template
+    prompt = PromptTemplates.create_sql_agent_prompt(db_type, prompt_schema, db_guidance)
+
+    # Create the agent
+    agent = create_tool_calling_agent(_llm, tools, prompt)
+
+    # Create the agent executor
+    executor = AgentExecutor(
+        agent=agent,
+        tools=tools,
+        verbose=False,
+        max_iterations=5,
+        max_execution_time=60,
+        return_intermediate_steps=True
+    )
+
+    # Answer cache: normalized question -> (response, execution_details).
+    # Repeat questions skip the Groq round trip(s) entirely; seeded from
+    # the on-disk store so hits survive process restarts
+    answer_cache: Dict[str, Tuple[str, List[Dict]]] = load_answers(
+        f"{db_url}|{schema_key}"
+    )
+    return executor, sql_executor, answer_cache
+
 class SQLAgent:
     """SQL Agent with safety checks and detailed logging"""
-    
+
     def __init__(self, db: SQLDatabase, groq_api_key: str = None):
         self.db = db
-        self.schema = db.get_table_info()
-        self.db_type = DatabaseDetector.detect_db_type(db)
+        self._db_url = db._engine.url.render_as_string(hide_password=True)
+        self.schema = load_schema(self._db_url, db)
+        # One pass over the schema dump yields both the per-table index
+        # (O(1) subset lookups) and the table count
+        self._schema_index = build_schema_index(self.schema)
+        self._tables_count = len(self._schema_index)
+        self.db_type = detect_db_type(db)
         
         logger.info(f"Initializing SQLAgent with database type: {self.db_type}")
         
         # Use provided API key or fall back to config
-        api_key = groq_api_key or Config.GROQ_API_KEY
+        api_key = groq_api_key or get_config().groq_api_key
         if not api_key:
             raise ValueError("Groq API key not provided and not found in configuration")
         
-        logger.info(f"Using Groq model: {Config.GROQ_MODEL}")
-        
-        # Initialize Groq LLM
-        self.llm = ChatGroq(
-            api_key=api_key,
-            model=Config.GROQ_MODEL,
-            temperature=0,
-            max_tokens=None,
-            timeout=30,
-            max_retries=2,
-        )
-        
-        # Initialize SQL executor with improved handling
-        self.sql_executor = SQLExecutor(self.db, self.db_type)
-        
-        # Create agent
-        self._create_agent()
-    
-    def _create_agent(self):
-        """Create the SQL agent using the new LangChain API"""
-        
-        # Create the tools list
-        sql_tool = create_sql_tool(self.sql_executor)
-        tools = [sql_tool]
-        
-        # Get database-specific guidance
-        db_guidance = DatabaseDetector.get_db_guidance(self.db_type)
-        
-        # Create the prompt template
-        prompt = PromptTemplates.create_sql_agent_prompt(
-            self.db_type, self.schema, db_guidance
-        )
-        
-        # Create the agent
-        agent = create_tool_calling_agent(self.llm, tools, prompt)
-        
-        # Create the agent executor
-        self.agent_executor = AgentExecutor(
-            agent=agent, 
-            tools=tools, 
-            verbose=False,
-            max_iterations=5,
-            max_execution_time=60,
-            return_intermediate_steps=True
+        logger.info(f"Using Groq model: {get_config().groq_model}")
+
+        # Initialize Groq LLM (cached across Streamlit reruns)
+        self.llm = get_llm(api_key, get_config().groq_model)
+
+        # Execution details from the most recent streaming chat
+        self.last_execution_details: List[Dict] = []
+
+        # Create agent (cached per connection/model/schema); the executor
+        # and its bound SQLExecutor are reused together so recent_results
+        # lookups stay consistent
+        schema_key = hashlib.blake2b(self.schema.encode(), digest_size=8).hexdigest()
+        self._cache_scope = f"{self._db_url}|{schema_key}"
+        self.agent_executor, self.sql_executor, self._answer_cache = build_executor(
+            self._db_url, get_config().groq_model, schema_key, self.db_type,
+            self.llm, self.db, self.schema
         )
     
+    def _cache_answer(self, question: str, response: str, details: List[Dict]):
+        """Remember a successful answer for reuse (bounded).
+
+        Keyed by the normalized question, so casing/punctuation/extra
+        whitespace variants of the same question hit the cache too. Also
+        written through to the on-disk store for cross-restart reuse.
+
+        Early-stop sentinels are skipped: caching (and persisting) one
+        would keep answering this question with a transient iteration/
+        time-limit failure instead of retrying the agent.
+        """
+        if response.startswith(_EARLY_STOP_PREFIX):
+            logger.info("Not caching early-stopped agent output")
+            return
+        if len(self._answer_cache) > 64:
+            self._answer_cache.clear()
+        key = _normalize_question(question)
+        self._answer_cache[key] = (response, details)
+        save_answer(self._cache_scope, key, response, details)
+
     def chat(self, question: str) -> Tuple[str, List[Dict]]:
         """Chat with the SQL agent and return response with execution details"""
         logger.info(f"Processing user question: {question}")
-        
+
+        cached = self._answer_cache.get(_normalize_question(question))
+        if cached is not None:
+            logger.info("Answer cache hit; skipping agent run")
+            return cached
+
         try:
             result = self.agent_executor.invoke({
                 "input": question,
                 "chat_history": []
             })
-            
+
             response = result.get("output", "No response generated.")
-            intermediate_steps = result.get("intermediate_steps", [])
-            
-            # Log the execution details
-            execution_details = []
-            for step in intermediate_steps:
-                if len(step) >= 2:
-                    action, observation = step[0], step[1]
-                    if hasattr(action, 'tool') and hasattr(action, 'tool_input'):
-                        execution_details.append({
-                            "tool": action.tool,
-                            "input": action.tool_input,
-                            "output": observation
-                        })
-                        
-                        # Log query execution if it's SQL
-                        if action.tool == 'execute_sql':
-                            query = action.tool_input.get('query', '')
-                            error = observation.startswith('Error:')
-                            QueryLogger.log_query_execution(
-                                query, observation, self.db_type, error
-                            )
-            
+            execution_details = self._collect_execution_details(
+                result.get("intermediate_steps", [])
+            )
+
+            logger.info(f"Agent completed processing. Response length: {len(response)}")
+            self._cache_answer(question, response, execution_details)
+            return response, execution_details
+
+        except Exception as e:
+            error_msg = f"Error during chat: {str(e)}"
+            logger.error(error_msg)
+            return error_msg, []
+
+    async def achat(self, question: str) -> Tuple[str, List[Dict]]:
+        """Async version of `chat` backed by `AgentExecutor.ainvoke`.
+
+        Lets the hosting event loop (e.g. Streamlit's Tornado loop) serve
+        other sessions while Groq is generating, instead of blocking a
+        thread for the full LLM round trip.
+        """
+        logger.info(f"Processing user question (async): {question}")
+
+        cached = self._answer_cache.get(_normalize_question(question))
+        if cached is not None:
+            logger.info("Answer cache hit; skipping agent run")
+            return cached
+
+        try:
+            result = await self.agent_executor.ainvoke({
+                "input": question,
+                "chat_history": []
+            })
+
+            response = result.get("output", "No response generated.")
+            execution_details = self._collect_execution_details(
+                result.get("intermediate_steps", [])
+            )
+
             logger.info(f"Agent completed processing. Response length: {len(response)}")
+            self._cache_answer(question, response, execution_details)
             return response, execution_details
-                
+
         except Exception as e:
             error_msg = f"Error during chat: {str(e)}"
             logger.error(error_msg)
             return error_msg, []
+
+    def _sql_detail(self, query: str, observation: str) -> Tuple[Dict, bool]:
+        """Build an execute_sql-shaped detail dict for one query.
+
+        Prefers the executor's structured result over the observation
+        text: O(1) error flag, the full (untruncated) result text for
+        the UI, and the natively fetched rows, skipping any re-parse.
+        """
+        exec_result = self.sql_executor.recent_results.get(query)
+        if exec_result is not None:
+            error = exec_result.is_error
+            output = exec_result.text
+            df = exec_result.df
+        else:
+            error = observation.startswith('Error:')
+            output = observation
+            df = None
+        detail = {
+            "tool": "execute_sql",
+            "input": {"query": query},
+            "output": output
+        }
+        if df is not None:
+            detail["df"] = df
+        return detail, error
+
+    def _collect_execution_details(self, intermediate_steps: List) -> List[Dict]:
+        """Extract tool call details from intermediate steps and log SQL runs.
+
+        Batch steps are expanded into one execute_sql-shaped detail per
+        query, so the query log and the UI's per-step rendering treat
+        them exactly like single-query steps.
+        """
+        execution_details = []
+        pending_logs = []
+        try:
+            # LangChain steps are always (action, observation) 2-tuples;
+            # unpack directly instead of length-checking and indexing
+            for action, observation in intermediate_steps:
+                if not isinstance(action, AgentAction):
+                    continue
+
+                if action.tool == 'execute_sql':
+                    queries = [action.tool_input.get('query', '')]
+                elif action.tool == 'execute_sql_batch':
+                    queries = action.tool_input.get('queries', []) or []
+                else:
+                    execution_details.append({
+                        "tool": action.tool,
+                        "input": action.tool_input,
+                        "output": observation
+                    })
+                    continue
+
+                for query in queries:
+                    detail, error = self._sql_detail(query, observation)
+                    # Collect SQL executions; logged as one batch below
+                    pending_logs.append((query, detail["output"], self.db_type, error))
+                    execution_details.append(detail)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Malformed intermediate step: {e}")
+
+        QueryLogger.log_batch(pending_logs)
+        return execution_details
     
+    async def achat_stream(self, question: str) -> AsyncIterator[str]:
+        """Stream answer tokens as they are generated.
+
+        Yields LLM token chunks from `astream_events` so the UI can render
+        incrementally instead of blocking on the full response. Tool
+        observations are collected into `self.last_execution_details` with
+        the same shape `chat()` returns.
+        """
+        logger.info(f"Processing user question (streaming): {question}")
+        self.last_execution_details = []
+
+        cached = self._answer_cache.get(_normalize_question(question))
+        if cached is not None:
+            logger.info("Answer cache hit; skipping agent run")
+            response, self.last_execution_details = cached
+            yield response
+            return
+
+        try:
+            chunks = []
+            events = self.agent_executor.astream_events(
+                {"input": question, "chat_history": []}, version="v2"
+            )
+            async for event in events:
+                kind = event["event"]
+
+                if kind == "on_chat_model_stream":
+                    chunk = event["data"]["chunk"]
+                    if isinstance(chunk.content, str) and chunk.content:
+                        chunks.append(chunk.content)
+                        yield chunk.content
+
+                elif kind == "on_tool_end":
+                    tool_name = event.get("name", "")
+                    tool_input = event["data"].get("input", {}) or {}
+                    observation = str(event["data"].get("output", ""))
+
+                    if tool_name == 'execute_sql':
+                        queries = [tool_input.get('query', '')]
+                    elif tool_name == 'execute_sql_batch':
+                        # Expand per query, same as _collect_execution_details
+                        queries = tool_input.get('queries', []) or []
+                    else:
+                        self.last_execution_details.append({
+                            "tool": tool_name,
+                            "input": tool_input,
+                            "output": observation
+                        })
+                        continue
+
+                    for query in queries:
+                        detail, error = self._sql_detail(query, observation)
+                        QueryLogger.log_query_execution(
+                            query, detail["output"], self.db_type, error
+                        )
+                        self.last_execution_details.append(detail)
+
+            if chunks:
+                self._cache_answer(question, "".join(chunks), self.last_execution_details)
+
+        except Exception as e:
+            error_msg = f"Error during chat: {str(e)}"
+            logger.error(error_msg)
+            yield error_msg
+
+    def chat_stream(self, question: str) -> Iterator[str]:
+        """Sync generator bridge over `achat_stream` for `st.write_stream`.
+
+        Steps the async generator on the shared persistent loop rather
+        than a throwaway per-call loop, so the LLM client's keep-alive
+        connections stay usable across questions.
+        """
+        agen = self.achat_stream(question)
+        loop = _stream_loop()
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(
+                    agen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                break
+
     def get_db_info(self) -> Dict[str, str]:
         """Get database information"""
         return {
             "type": self.db_type,
             "schema": self.schema,
-            "tables_count": len(self.schema.split("CREATE TABLE")) - 1
+            "tables_count": self._tables_count
         }
     
     def test_query(self, query: str) -> str:
@@ -0,0 +1,100 @@
+"""Offline batch runner for SQL Agent ChatBot.
+
+Replays a JSONL corpus of questions through the agent outside the
+Streamlit UI — useful for regression-testing prompt changes against a
+known query set or pre-warming the answer cache before a demo. Prompts
+run concurrently (bounded) through the async chat path, and results are
+persisted to a local SQLite file for later inspection:
+
+    python batch_runner.py prompts.jsonl --db ./mydata.db
+
+Input rows look like {"prompt": "How many customers are there?"}.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+
+from agent import SQLAgent
+from database import create_sqlite_connection
+
+logger = logging.getLogger(__name__)
+
+# How many prompts are in flight at once; Groq rate limits make unbounded
+# fan-out counterproductive
+_MAX_CONCURRENCY = 4
+
+_RESULTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batch_results (
+    prompt TEXT,
+    response TEXT,
+    latency_ms INTEGER,
+    error INTEGER
+)
+"""
+
+def load_prompts(path: str) -> list:
+    """Read one prompt per JSONL row, skipping blank lines"""
+    prompts = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                prompts.append(json.loads(line)["prompt"])
+    return prompts
+
+async def run_batch(agent: SQLAgent, prompts: list) -> list:
+    """Run all prompts through the agent with bounded concurrency.
+
+    Returns (prompt, response, latency_ms, error) rows in input order;
+    answer-cache hits from duplicate prompts come back in microseconds.
+    """
+    semaphore = asyncio.Semaphore(_MAX_CONCURRENCY)
+
+    async def run_one(prompt: str):
+        async with semaphore:
+            start = time.perf_counter()
+            response, _ = await agent.achat(prompt)
+            latency_ms = int((time.perf_counter() - start) * 1000)
+            error = response.startswith("Error during chat:")
+            logger.info("Batch prompt done in %dms: %.80s", latency_ms, prompt)
+            return (prompt, response, latency_ms, int(error))
+
+    return list(await asyncio.gather(*(run_one(p) for p in prompts)))
+
+def persist_results(results: list, results_db: str):
+    """Append result rows to the local results database"""
+    with sqlite3.connect(results_db) as conn:
+        conn.execute(_RESULTS_SCHEMA)
+        conn.executemany(
+            "INSERT INTO batch_results VALUES (?, ?, ?, ?)", results
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a prompt corpus through the SQL agent")
+    parser.add_argument("prompts", help="JSONL file with one {\"prompt\": ...} per line")
+    parser.add_argument("--db", required=True, help="Path to the SQLite database to query")
+    parser.add_argument("--results-db", default="batch_results.db",
+                        help="Where to persist results (default: batch_results.db)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    prompts = load_prompts(args.prompts)
+    logger.info("Loaded %d prompts from %s", len(prompts), args.prompts)
+
+    db = create_sqlite_connection(args.db)
+    agent = SQLAgent(db)
+
+    results = asyncio.run(run_batch(agent, prompts))
+    persist_results(results, args.results_db)
+
+    errors = sum(r[3] for r in results)
+    logger.info("Batch complete: %d prompts, %d errors, results in %s",
+                len(results), errors, args.results_db)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Persistent answer cache for SQL Agent ChatBot.
+
+The in-memory answer cache (see agent.build_executor) dies with the
+process, which makes dev reloads and Streamlit restarts forget every
+memoized response. This module mirrors it to a local SQLite file so
+cache hits survive restarts and are shared across workers. Writes are
+one row per completed answer, so per-call overhead is negligible; any
+storage failure degrades to the in-memory cache only.
+"""
+import json
+import logging
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_CACHE_DB = "answer_cache.db"
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answer_cache (
+    scope TEXT NOT NULL,
+    question TEXT NOT NULL,
+    response TEXT NOT NULL,
+    details TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    PRIMARY KEY (scope, question)
+)
+"""
+
+# Entries older than this are dropped on load; stale answers for a
+# changed database are bounded even if the schema digest didn't move
+_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(_CACHE_DB)
+    # WAL keeps readers unblocked during writes; NORMAL sync is plenty
+    # for a rebuildable cache
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(_CACHE_SCHEMA)
+    return conn
+
+def load_answers(scope: str) -> Dict[str, Tuple[str, List[Dict]]]:
+    """Load the persisted answers for a connection scope (best effort)"""
+    try:
+        with closing(_connect()) as conn:
+            cutoff = int(time.time()) - _MAX_AGE_SECONDS
+            conn.execute("DELETE FROM answer_cache WHERE ts < ?", (cutoff,))
+            rows = conn.execute(
+                "SELECT question, response, details FROM answer_cache WHERE scope = ?",
+                (scope,)
+            ).fetchall()
+            conn.commit()
+        cache = {q: (r, json.loads(d)) for q, r, d in rows}
+        if cache:
+            logger.info("Loaded %d cached answers for scope %.16s...", len(cache), scope)
+        return cache
+    except Exception as e:
+        logger.warning("Could not load persisted answer cache: %s", e)
+        return {}
+
+def save_answer(scope: str, question: str, response: str, details: List[Dict]):
+    """Write one answer through to disk (best effort).
+
+    DataFrame attachments are dropped: they aren't JSON-serializable and
+    the UI re-parses the result text when they're absent.
+    """
+    try:
+        slim = [{k: v for k, v in d.items() if k != "df"} for d in details]
+        payload = json.dumps(slim, default=str)
+        with closing(_connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answer_cache VALUES (?, ?, ?, ?, ?)",
+                (scope, question, response, payload, int(time.time()))
+            )
+            conn.commit()
+    except Exception as e:
+        logger.warning("Could not persist answer: %s", e)
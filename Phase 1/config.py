@@ -1,63 +1,98 @@
 """Configuration management for SQL Agent ChatBot"""
 import os
-from typing import Dict, Any
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+@dataclass(frozen=True, slots=True)
 class Config:
-    """Application configuration class"""
-    
+    """Application configuration, read from the environment once"""
+
     # Groq Configuration
-    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-    GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-70b-8192")
-    
+    groq_api_key: Optional[str]
+    groq_model: str
+
     # Query Configuration
-    MAX_QUERY_RESULTS = int(os.getenv("MAX_QUERY_RESULTS", "10"))
-    
+    max_query_results: int
+
     # MySQL Configuration
-    MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
-    MYSQL_PORT = int(os.getenv("MYSQL_PORT", "3306"))
-    MYSQL_USER = os.getenv("MYSQL_USER")
-    MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
-    MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
-    
+    mysql_host: str
+    mysql_port: int
+    mysql_user: Optional[str]
+    mysql_password: Optional[str]
+    mysql_database: Optional[str]
+
     # PostgreSQL Configuration
-    POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
-    POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", "5432"))
-    POSTGRES_USER = os.getenv("POSTGRES_USER")
-    POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
-    POSTGRES_DATABASE = os.getenv("POSTGRES_DATABASE")
-    
+    postgres_host: str
+    postgres_port: int
+    postgres_user: Optional[str]
+    postgres_password: Optional[str]
+    postgres_database: Optional[str]
+
+    # Connection pool tuning (server databases)
+    db_pool_size: int
+    db_max_overflow: int
+    db_pool_timeout: int
+
     # Logging Configuration
-    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
-    LOG_FILE = os.getenv("LOG_FILE", "sql_agent.log")
-    
-    @classmethod
-    def to_dict(cls) -> Dict[str, Any]:
+    log_level: str
+    log_file: str
+
+    def to_dict(self) -> Dict[str, Any]:
         """Convert configuration to dictionary"""
         return {
-            "groq_api_key": cls.GROQ_API_KEY,
-            "groq_model": cls.GROQ_MODEL,
-            "max_results": cls.MAX_QUERY_RESULTS,
-            "mysql_host": cls.MYSQL_HOST,
-            "mysql_port": cls.MYSQL_PORT,
-            "mysql_user": cls.MYSQL_USER,
-            "mysql_password": cls.MYSQL_PASSWORD,
-            "mysql_database": cls.MYSQL_DATABASE,
-            "postgres_host": cls.POSTGRES_HOST,
-            "postgres_port": cls.POSTGRES_PORT,
-            "postgres_user": cls.POSTGRES_USER,
-            "postgres_password": cls.POSTGRES_PASSWORD,
-            "postgres_database": cls.POSTGRES_DATABASE,
+            "groq_api_key": self.groq_api_key,
+            "groq_model": self.groq_model,
+            "max_results": self.max_query_results,
+            "mysql_host": self.mysql_host,
+            "mysql_port": self.mysql_port,
+            "mysql_user": self.mysql_user,
+            "mysql_password": self.mysql_password,
+            "mysql_database": self.mysql_database,
+            "postgres_host": self.postgres_host,
+            "postgres_port": self.postgres_port,
+            "postgres_user": self.postgres_user,
+            "postgres_password": self.postgres_password,
+            "postgres_database": self.postgres_database,
         }
-    
-    @classmethod
-    def validate(cls) -> Dict[str, bool]:
+
+    def validate(self) -> Dict[str, bool]:
         """Validate configuration"""
         return {
-            "groq_api_key": bool(cls.GROQ_API_KEY),
-            "mysql_complete": bool(cls.MYSQL_USER and cls.MYSQL_PASSWORD and cls.MYSQL_DATABASE),
-            "postgres_complete": bool(cls.POSTGRES_USER and cls.POSTGRES_PASSWORD and cls.POSTGRES_DATABASE)
-        }
\ No newline at end of file
+            "groq_api_key": bool(self.groq_api_key),
+            "mysql_complete": bool(self.mysql_user and self.mysql_password and self.mysql_database),
+            "postgres_complete": bool(self.postgres_user and self.postgres_password and self.postgres_database)
+        }
+
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Build the frozen configuration once and share it everywhere.
+
+    The frozen/slots dataclass keeps attribute access cheap on hot paths
+    (no per-instance __dict__) and the lru_cache means the environment is
+    only read once per process.
+    """
+    return Config(
+        groq_api_key=os.getenv("GROQ_API_KEY"),
+        groq_model=os.getenv("GROQ_MODEL", "llama3-70b-8192"),
+        max_query_results=int(os.getenv("MAX_QUERY_RESULTS", "10")),
+        mysql_host=os.getenv("MYSQL_HOST", "localhost"),
+        mysql_port=int(os.getenv("MYSQL_PORT", "3306")),
+        mysql_user=os.getenv("MYSQL_USER"),
+        mysql_password=os.getenv("MYSQL_PASSWORD"),
+        mysql_database=os.getenv("MYSQL_DATABASE"),
+        postgres_host=os.getenv("POSTGRES_HOST", "localhost"),
+        postgres_port=int(os.getenv("POSTGRES_PORT", "5432")),
+        postgres_user=os.getenv("POSTGRES_USER"),
+        postgres_password=os.getenv("POSTGRES_PASSWORD"),
+        postgres_database=os.getenv("POSTGRES_DATABASE"),
+        db_pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+        db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        db_pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        log_level=os.getenv("LOG_LEVEL", "INFO"),
+        log_file=os.getenv("LOG_FILE", "sql_agent.log"),
+    )
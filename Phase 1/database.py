@@ -1,135 +1,342 @@
 """Database connection utilities for SQL Agent ChatBot"""
-from urllib.parse import quote_plus
-from typing import Dict, Any
+import asyncio
+import random
+import re
+import time
+from functools import lru_cache
+from typing import Dict, Any, List, Mapping
+from types import MappingProxyType
+from weakref import WeakKeyDictionary
 import logging
 from langchain_community.utilities import SQLDatabase
+from sqlalchemy import event
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.pool import StaticPool
+from config import get_config
 
 logger = logging.getLogger(__name__)
 
-class DatabaseConfig:
-    """Handle different database configurations"""
-    
-    @staticmethod
-    def create_sqlite_connection(db_file_path: str) -> SQLDatabase:
-        """Create SQLite connection from file path"""
-        logger.info(f"Creating SQLite connection to: {db_file_path}")
-        return SQLDatabase.from_uri(f"sqlite:///{db_file_path}")
-    
-    @staticmethod
-    def create_mysql_connection(config: Dict[str, Any]) -> SQLDatabase:
-        """Create MySQL connection from config, safely encoding special chars in password"""
-        encoded_password = quote_plus(config['password'])
-        mysql_uri = (
-            f"mysql+pymysql://{config['user']}:{encoded_password}"
-            f"@{config['host']}:{config['port']}/{config['database']}"
-        )
-        logger.info(f"Creating MySQL connection to: {config['host']}:{config['port']}/{config['database']}")
-        return SQLDatabase.from_uri(mysql_uri)
-    
-    @staticmethod
-    def create_postgresql_connection(config: Dict[str, Any]) -> SQLDatabase:
-        """Create PostgreSQL connection from config"""
-        postgres_uri = f"postgresql://{config['user']}:{config['password']}@{config['host']}:{config['port']}/{config['database']}"
-        logger.info(f"Creating PostgreSQL connection to: {config['host']}:{config['port']}/{config['database']}")
-        return SQLDatabase.from_uri(postgres_uri)
-
-class DatabaseDetector:
-    """Database type detection utilities"""
-    
-    @staticmethod
-    def detect_db_type(db: SQLDatabase) -> str:
-        """Detect database type from URI"""
-        try:
-            # Try different ways to get the database URL
-            if hasattr(db, 'engine') and hasattr(db.engine, 'url'):
-                uri = str(db.engine.url)
-            elif hasattr(db, '_engine') and hasattr(db._engine, 'url'):
-                uri = str(db._engine.url)
-            elif hasattr(db, 'db_chain') and hasattr(db.db_chain, 'database'):
-                # For newer LangChain versions
-                engine = db.db_chain.database.engine
-                uri = str(engine.url)
-            else:
-                # Fallback: try to get dialect name directly
-                if hasattr(db, 'dialect'):
-                    dialect = str(db.dialect)
-                elif hasattr(db, '_engine'):
-                    dialect = str(db._engine.dialect.name)
-                else:
-                    logger.warning("Could not detect database type - no recognizable attributes")
-                    return 'unknown'
-                
-                if 'mysql' in dialect.lower():
-                    return 'mysql'
-                elif 'postgresql' in dialect.lower() or 'postgres' in dialect.lower():
-                    return 'postgresql'
-                elif 'sqlite' in dialect.lower():
-                    return 'sqlite'
-                else:
-                    return 'unknown'
-            
-            # Parse URI to determine database type
-            if uri.startswith('sqlite'):
-                return 'sqlite'
-            elif uri.startswith('mysql'):
-                return 'mysql'
-            elif uri.startswith('postgresql'):
-                return 'postgresql'
-            else:
-                logger.warning(f"Unknown database URI format: {uri}")
-                return 'unknown'
-                
-        except Exception as e:
-            logger.warning(f"Could not detect database type: {e}")
-            # Try to inspect the database object further
-            try:
-                # Alternative detection method
-                if hasattr(db, 'run'):
-                    # Test with a simple query to detect type
-                    test_queries = {
-                        'sqlite': "SELECT name FROM sqlite_master WHERE type='table' LIMIT 1",
-                        'mysql': "SELECT TABLE_NAME FROM information_schema.TABLES LIMIT 1",
-                        'postgresql': "SELECT tablename FROM pg_tables LIMIT 1"
-                    }
-                    
-                    for db_type, query in test_queries.items():
-                        try:
-                            result = db.run(query)
-                            logger.info(f"Database type detected as {db_type} via test query")
-                            return db_type
-                        except Exception:
-                            continue
-                    
-                logger.warning("Could not detect database type via test queries either")
-                return 'unknown'
-            except Exception as e2:
-                logger.error(f"Failed all database type detection methods: {e2}")
-                return 'unknown'
-    
-    @staticmethod
-    def get_db_guidance(db_type: str) -> str:
-        """Get database-specific guidance"""
-        guidance = {
-            'sqlite': """
+# First identifier after CREATE TABLE, with optional quoting
+_TABLE_NAME_RE = re.compile(r'[`"\[]?(\w+)')
+
+def build_schema_index(schema: str) -> Dict[str, str]:
+    """Index a get_table_info() dump by table name in a single pass.
+
+    Returns {table_name: create_statement_chunk}; looking up the schema
+    text for a subset of tables is then O(1) per table instead of
+    re-scanning every CREATE TABLE part per lookup.
+    """
+    index: Dict[str, str] = {}
+    for part in schema.split('CREATE TABLE')[1:]:
+        m = _TABLE_NAME_RE.match(part.lstrip())
+        if m:
+            index[m.group(1)] = 'CREATE TABLE' + part
+    return index
+
+def schema_for_tables(schema_index: Dict[str, str], tables: List[str]) -> str:
+    """Join the schema chunks for the given tables (unknown names skipped)"""
+    return ''.join(schema_index[t] for t in tables if t in schema_index)
+
+# Dialect base name -> db type; built once so detection is a dict lookup
+# instead of a branch chain with per-call lower() copies
+_DIALECT_MAP: Mapping[str, str] = MappingProxyType({
+    'sqlite': 'sqlite',
+    'mysql': 'mysql',
+    'mariadb': 'mysql',
+    'postgresql': 'postgresql',
+    'postgres': 'postgresql',
+})
+
+@lru_cache(maxsize=8)
+def _detect_from_driver(driver: str) -> str:
+    """Map a SQLAlchemy drivername (e.g. 'mysql+pymysql') to a db type"""
+    return _DIALECT_MAP.get(driver.split('+', 1)[0].lower(), 'unknown')
+
+# Database-specific guidance, built once at import; MappingProxyType keeps
+# it read-only without per-call dict construction
+_DB_GUIDANCE: Mapping[str, str] = MappingProxyType({
+    'sqlite': """
 For SQLite:
 - List tables: SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'
 - Table info: PRAGMA table_info(table_name)
 """,
-            'mysql': """
+    'mysql': """
 For MySQL:
 - List tables: SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
 - Table info: DESCRIBE table_name or SELECT * FROM information_schema.COLUMNS WHERE TABLE_NAME = 'table_name' AND TABLE_SCHEMA = DATABASE()
 """,
-            'postgresql': """
+    'postgresql': """
 For PostgreSQL:
 - List tables: SELECT tablename FROM pg_tables WHERE schemaname = 'public'
 - Table info: SELECT column_name, data_type FROM information_schema.columns WHERE table_name = 'table_name'
 """,
-            'unknown': """
+    'unknown': """
 For Unknown Database Type:
 - Try standard SQL queries
 - Use INFORMATION_SCHEMA if available
 - Check database documentation for specific syntax
 """
+})
+
+def _engine_args(kind: str) -> Dict[str, Any]:
+    """Engine arguments per connection kind.
+
+    Server databases get an explicitly sized QueuePool (tunable via
+    DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT) with pre_ping to
+    drop silently dead connections and a recycle under common idle
+    timeouts. SQLite allows cross-thread use since queries may run off
+    the event loop, and in-memory databases need StaticPool so every
+    checkout sees the same database.
+    """
+    if kind in ('mysql', 'postgresql'):
+        config = get_config()
+        args: Dict[str, Any] = {
+            "pool_size": config.db_pool_size,
+            "max_overflow": config.db_max_overflow,
+            "pool_timeout": config.db_pool_timeout,
+            "pool_pre_ping": True,
+            "pool_recycle": 300,
+            # The agent re-issues similar SELECTs; a roomier compiled-SQL
+            # cache keeps their parse/compile step a dict hit
+            "query_cache_size": 1200,
+            "connect_args": {"connect_timeout": 10},
+        }
+        if kind == 'postgresql':
+            # Visible in pg_stat_activity when debugging pool exhaustion
+            args["connect_args"]["application_name"] = "sql-agent-chatbot"
+        return args
+    if kind == 'sqlite_memory':
+        return {
+            "poolclass": StaticPool,
+            "connect_args": {"timeout": 10, "check_same_thread": False},
         }
-        return guidance.get(db_type, guidance['unknown'])
\ No newline at end of file
+    # File-backed SQLite: one persistent handle is enough (writes are
+    # serialized by SQLite anyway); overflow slots cover concurrent batch
+    # reads and cost only a cheap local file open
+    return {
+        "pool_size": 1,
+        "max_overflow": 4,
+        "connect_args": {"timeout": 10, "check_same_thread": False},
+    }
+
+def _connect_with_retry(uri, engine_args: Dict[str, Any],
+                        max_retries: int = 3, base_delay: float = 1.0,
+                        max_delay: float = 30.0) -> SQLDatabase:
+    """Connect with exponential backoff on transient failures.
+
+    A DNS blip or TCP reset at connect time previously killed the chat
+    session outright. Driver-level errors (OperationalError/DBAPIError)
+    are retried with jittered exponential delays; configuration mistakes
+    (bad URI, missing driver) raise other types and propagate at once.
+    """
+    for attempt in range(max_retries):
+        try:
+            return SQLDatabase.from_uri(uri, engine_args=engine_args)
+        except (OperationalError, DBAPIError) as e:
+            if attempt == max_retries - 1:
+                raise
+            delay = min(max_delay,
+                        base_delay * (2 ** attempt) * (1 + random.random() * 0.5))
+            logger.warning(
+                "Transient connection failure (attempt %d/%d), retrying in %.1fs: %s",
+                attempt + 1, max_retries, delay, e
+            )
+            time.sleep(delay)
+
+class CircuitOpenError(RuntimeError):
+    """Raised when connects to a host are suspended after repeated failures"""
+
+# Consecutive-failure circuit breaker per host:port. During an outage
+# each attempt otherwise blocks the full connect timeout before failing;
+# once tripped, callers fail in microseconds until the cooldown lapses,
+# after which one probe attempt is let through (half-open).
+_BREAKER_THRESHOLD = 5
+_BREAKER_COOLDOWN = 30.0
+_breakers: Dict[str, Dict[str, float]] = {}
+
+def _breaker_check(key: str):
+    """Fail fast if the breaker for this host is open"""
+    breaker = _breakers.get(key)
+    if breaker and breaker['failures'] >= _BREAKER_THRESHOLD:
+        remaining = _BREAKER_COOLDOWN - (time.monotonic() - breaker['opened_at'])
+        if remaining > 0:
+            raise CircuitOpenError(
+                f"Connections to {key} suspended for another "
+                f"{remaining:.0f}s after repeated failures"
+            )
+
+def _breaker_record(key: str, ok: bool):
+    """Track the outcome of a connect attempt"""
+    if ok:
+        _breakers.pop(key, None)
+        return
+    breaker = _breakers.setdefault(key, {'failures': 0, 'opened_at': 0.0})
+    breaker['failures'] += 1
+    breaker['opened_at'] = time.monotonic()
+    if breaker['failures'] == _BREAKER_THRESHOLD:
+        logger.error("Circuit opened for %s after %d consecutive failures",
+                     key, _BREAKER_THRESHOLD)
+
+def _guarded_server_connect(uri, host: Any, port: Any, kind: str) -> SQLDatabase:
+    """Server connect guarded by the per-host circuit breaker"""
+    key = f"{host}:{port}"
+    _breaker_check(key)
+    try:
+        db = _cached_from_uri(uri, kind)
+    except Exception:
+        _breaker_record(key, ok=False)
+        raise
+    _breaker_record(key, ok=True)
+    return db
+
+@lru_cache(maxsize=8)
+def _cached_from_uri(uri, kind: str) -> SQLDatabase:
+    """Build (or reuse) the SQLDatabase for a connection URI.
+
+    Engine construction parses the URI, imports the driver and reflects
+    metadata — hundreds of milliseconds on server databases — and every
+    caller (UI reconnects, batch runner) previously paid it anew.
+    Memoizing per URI makes repeat connections a dict lookup and means
+    one shared pool per database instead of one per call. Server
+    connections retry transient failures; only successes are cached
+    (lru_cache doesn't memoize raised exceptions).
+    """
+    engine_args = _engine_args(kind)
+    if kind in ('mysql', 'postgresql'):
+        return _connect_with_retry(uri, engine_args)
+    db = SQLDatabase.from_uri(uri, engine_args=engine_args)
+    _tune_sqlite(db._engine)
+    return db
+
+# Read-throughput PRAGMAs for the agent's analytics-style workload: WAL
+# keeps readers unblocked, NORMAL sync is safe with WAL, and the larger
+# cache/mmap settings speed repeated scans. All are per-connection except
+# journal_mode, which persists in the database file.
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+def _tune_sqlite(engine):
+    """Apply the tuning PRAGMAs to current and future connections"""
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        for pragma in _SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+    # Connections already sitting in the pool (from_uri connects once for
+    # reflection) won't fire the listener; tune them directly
+    try:
+        with engine.connect() as conn:
+            for pragma in _SQLITE_PRAGMAS:
+                conn.exec_driver_sql(pragma)
+    except Exception as e:
+        logger.warning("Could not apply SQLite PRAGMAs: %s", e)
+
+# URL assembly memoized per credential tuple, built structurally with
+# URL.create: no manual percent-encoding, no string parse for
+# create_engine to redo, and special characters in user/password/
+# database names are handled for both server dialects.
+@lru_cache(maxsize=32)
+def _server_url(drivername: str, user: str, password: str,
+                host: str, port: int, database: str) -> URL:
+    return URL.create(drivername=drivername, username=user, password=password,
+                      host=host, port=int(port), database=database)
+
+def create_sqlite_connection(db_file_path: str) -> SQLDatabase:
+    """Create SQLite connection from file path"""
+    logger.info("Creating SQLite connection to: %s", db_file_path)
+    kind = 'sqlite_memory' if ':memory:' in db_file_path else 'sqlite'
+    return _cached_from_uri(f"sqlite:///{db_file_path}", kind)
+
+def _config_url(config: Dict[str, Any], drivername: str) -> URL:
+    """Resolve the SQLAlchemy URL for a server config, caching it on the
+    config dict so retry loops that re-pass the same dict skip even the
+    memoized build."""
+    url = config.get('_sqlalchemy_url')
+    if url is None:
+        url = _server_url(drivername, config['user'], config['password'],
+                          config['host'], config['port'], config['database'])
+        config['_sqlalchemy_url'] = url
+    return url
+
+def create_mysql_connection(config: Dict[str, Any]) -> SQLDatabase:
+    """Create MySQL connection from config, safely encoding special chars in password"""
+    mysql_uri = _config_url(config, 'mysql+pymysql')
+    logger.info("Creating MySQL connection to: %s:%s/%s",
+                config['host'], config['port'], config['database'])
+    return _guarded_server_connect(mysql_uri, config['host'], config['port'], 'mysql')
+
+def create_postgresql_connection(config: Dict[str, Any]) -> SQLDatabase:
+    """Create PostgreSQL connection from config, safely encoding special chars in password"""
+    postgres_uri = _config_url(config, 'postgresql')
+    logger.info("Creating PostgreSQL connection to: %s:%s/%s",
+                config['host'], config['port'], config['database'])
+    return _guarded_server_connect(postgres_uri, config['host'], config['port'], 'postgresql')
+
+# Async counterparts for callers already on the event loop (the batch
+# runner, any future async server). A cold server connect blocks for the
+# full TCP+auth handshake — hundreds of milliseconds — so it runs in a
+# worker thread instead of stalling every in-flight coroutine. Cache hits
+# in _cached_from_uri make the thread hop the only cost on repeat calls.
+
+async def acreate_sqlite_connection(db_file_path: str) -> SQLDatabase:
+    """Async variant of create_sqlite_connection"""
+    return await asyncio.to_thread(create_sqlite_connection, db_file_path)
+
+async def acreate_mysql_connection(config: Dict[str, Any]) -> SQLDatabase:
+    """Async variant of create_mysql_connection"""
+    return await asyncio.to_thread(create_mysql_connection, config)
+
+async def acreate_postgresql_connection(config: Dict[str, Any]) -> SQLDatabase:
+    """Async variant of create_postgresql_connection"""
+    return await asyncio.to_thread(create_postgresql_connection, config)
+
+# Detection result per SQLDatabase; weak keys so cached entries don't
+# keep disconnected databases alive
+_DETECTED_TYPES: "WeakKeyDictionary[SQLDatabase, str]" = WeakKeyDictionary()
+
+def detect_db_type(db: SQLDatabase) -> str:
+    """Detect database type, memoized per SQLDatabase instance"""
+    cached = _DETECTED_TYPES.get(db)
+    if cached is not None:
+        return cached
+
+    db_type = _detect_db_type_uncached(db)
+    try:
+        _DETECTED_TYPES[db] = db_type
+    except TypeError:
+        pass  # non-weakref-able adapter; detection stays cheap anyway
+    return db_type
+
+def _detect_db_type_uncached(db: SQLDatabase) -> str:
+    """Single-pass detection from engine attributes.
+
+    The dialect name is an O(1) attribute — no URL render — and the
+    drivername covers odd dialect spellings. The old fallback that
+    probed the live database with per-dialect test queries is gone:
+    three network round trips to learn what the engine already knows.
+    """
+    for attr in ('dialect', 'url'):
+        try:
+            engine = getattr(db, '_engine', None) or db.engine
+            name = (engine.dialect.name if attr == 'dialect'
+                    else engine.url.drivername)
+            detected = _detect_from_driver(name)
+            if detected != 'unknown':
+                return detected
+        except Exception:
+            continue
+
+    logger.warning("Could not detect database type from engine attributes")
+    return 'unknown'
+
+def get_db_guidance(db_type: str) -> str:
+    """Get database-specific guidance"""
+    return _DB_GUIDANCE.get(db_type.lower(), _DB_GUIDANCE['unknown'])
\ No newline at end of file
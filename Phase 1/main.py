@@ -1,18 +1,40 @@
 """Enhanced main application for SQL Agent ChatBot with better table display"""
 import streamlit as st
 import logging
-from config import Config
-from ui import DatabaseUI, ChatUI, ConnectionManager
-
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, Config.LOG_LEVEL.upper()),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(Config.LOG_FILE),
+import queue
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+from config import get_config
+from ui import DatabaseUI, ChatUI, ConnectionManager, extract_result_part
+
+@st.cache_resource
+def setup_logging() -> QueueListener:
+    """Configure non-blocking logging, once per process.
+
+    Log calls on the chat hot path only do a queue put; the listener
+    thread owns the file and stream handlers, so disk flushes never stall
+    the request path. Cached as a resource so reruns reuse the listener.
+    """
+    config = get_config()
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler(config.log_file),
         logging.StreamHandler()
     ]
-)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, config.log_level.upper()))
+    root.handlers.clear()
+    root.addHandler(QueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Page configuration
@@ -24,18 +46,18 @@ st.set_page_config(
 )
 
 def initialize_session_state():
-    """Initialize session state variables"""
-    default_states = {
+    """Initialize session state variables (no-op after the first rerun)"""
+    if st.session_state.setdefault("_initialized", False):
+        return
+
+    st.session_state.update({
         "messages": [],
         "db_connected": False,
         "agent": None,
         "db_schema": None,
-        "query_logs": []
-    }
-    
-    for key, default_value in default_states.items():
-        if key not in st.session_state:
-            st.session_state[key] = default_value
+        "query_logs": deque(maxlen=50)  # bounded ring; O(1) eviction
+    })
+    st.session_state._initialized = True
 
 def render_sidebar():
     """Render the sidebar with database configuration"""
@@ -48,15 +70,19 @@ def render_sidebar():
         # Show query logs
         DatabaseUI.show_query_logs()
         
-        # Database configuration form
-        db_type, connection_config, has_groq_key = DatabaseUI.render_database_config()
-        
-        # Connect button
-        if st.button("🔌 Connect to Database", type="primary"):
+        # Database configuration form; st.form batches keystrokes so the
+        # script only reruns on submit instead of per input edit
+        db_type = DatabaseUI.render_db_type_select()
+        sqlite_source = DatabaseUI.render_sqlite_source_select(db_type)
+        with st.form("db_config"):
+            connection_config, has_groq_key = DatabaseUI.render_database_config(db_type, sqlite_source)
+            submitted = st.form_submit_button("🔌 Connect to Database", type="primary")
+
+        if submitted:
             if not has_groq_key:
                 st.error("Please set GROQ_API_KEY in your .env file")
             else:
-                ConnectionManager.attempt_connection(db_type, connection_config, Config.GROQ_API_KEY)
+                ConnectionManager.attempt_connection(db_type, connection_config, get_config().groq_api_key)
         
         # Disconnect button
         if st.session_state.db_connected:
@@ -73,8 +99,36 @@ def render_main_content():
     else:
         render_chat_interface()
 
+@st.fragment
+def render_message(message: dict):
+    """Render a single chat message in its own fragment scope.
+
+    Past messages re-parse their tool outputs on every full-script rerun;
+    scoping each one to a fragment lets unrelated widget interactions
+    (sidebar inputs, chat typing) skip re-rendering the history.
+    """
+    with st.chat_message(message["role"]):
+        if message["role"] == "assistant" and "execution_details" in message:
+            # Use enhanced display for assistant messages
+            ChatUI.display_chat_response_enhanced(
+                message["content"],
+                message["execution_details"]
+            )
+
+            # Show execution details in expander
+            ChatUI.display_execution_details(message["execution_details"])
+        else:
+            # Regular display for user messages
+            st.markdown(message["content"])
+
+@st.fragment
 def render_chat_interface():
-    """Render the chat interface when connected"""
+    """Render the chat interface when connected.
+
+    Scoped to a fragment so chat input, quick actions and clearing the
+    history rerun only this panel instead of the whole script (sidebar,
+    env status, connection form included).
+    """
     # Database schema info
     with st.expander("📊 Database Schema", expanded=False):
         if st.session_state.db_schema:
@@ -90,8 +144,8 @@ def render_chat_interface():
                 st.write("**Test Result:**")
                 
                 # Try to display as table
-                if "RESULT:" in result:
-                    result_part = result.split("RESULT:", 1)[1].strip()
+                result_part = extract_result_part(result)
+                if result_part is not None:
                     success = ChatUI._try_display_as_table(result_part)
                     if not success:
                         st.code(result)
@@ -103,19 +157,7 @@ def render_chat_interface():
     
     # Display chat messages with enhanced rendering
     for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            if message["role"] == "assistant" and "execution_details" in message:
-                # Use enhanced display for assistant messages
-                ChatUI.display_chat_response_enhanced(
-                    message["content"], 
-                    message["execution_details"]
-                )
-                
-                # Show execution details in expander
-                ChatUI.display_execution_details(message["execution_details"])
-            else:
-                # Regular display for user messages
-                st.markdown(message["content"])
+        render_message(message)
     
     # Chat input
     if prompt := st.chat_input("Ask a question about your database..."):
@@ -133,23 +175,20 @@ def handle_user_input(prompt: str):
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # Get AI response
+    # Get AI response, streaming tokens as they arrive
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response, execution_details = st.session_state.agent.chat(prompt)
-            
-            # Use enhanced display for the response
-            ChatUI.display_chat_response_enhanced(response, execution_details)
-            
-            # Show execution details
-            ChatUI.display_execution_details(execution_details)
-            
-            # Store message with execution details
-            st.session_state.messages.append({
-                "role": "assistant", 
-                "content": response,
-                "execution_details": execution_details
-            })
+        response = st.write_stream(st.session_state.agent.chat_stream(prompt))
+        execution_details = st.session_state.agent.last_execution_details
+
+        # Show execution details
+        ChatUI.display_execution_details(execution_details)
+
+        # Store message with execution details
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": response,
+            "execution_details": execution_details
+        })
 
 def main():
     """Main application function"""
@@ -1,32 +1,48 @@
 """Prompt templates for SQL Agent ChatBot"""
+import hashlib
+import streamlit as st
 from langchain_core.prompts import ChatPromptTemplate
-from config import Config
+from config import get_config
 
 class PromptTemplates:
     """SQL Agent prompt templates"""
-    
+
     @staticmethod
     def create_sql_agent_prompt(db_type: str, schema: str, db_guidance: str) -> ChatPromptTemplate:
-        """Create the main SQL agent prompt template"""
-        
-        system_message = f"""You are a helpful SQL analyst assistant.
+        """Create (or reuse) the main SQL agent prompt template.
 
-Database Type: {db_type.upper()}
-Database Schema:
-{schema}
+        The template only depends on (db_type, schema, max_results), so it
+        is memoized across SQLAgent rebuilds; the schema is keyed by a
+        short digest instead of hashing the full string on every lookup.
+        """
+        schema_key = hashlib.blake2b(schema.encode(), digest_size=8).hexdigest()
+        return _build_sql_agent_prompt(
+            db_type, schema_key, schema, db_guidance, get_config().max_query_results
+        )
 
-{db_guidance}
+@st.cache_resource(show_spinner=False)
+def _build_sql_agent_prompt(db_type: str, schema_key: str, _schema: str,
+                            db_guidance: str, max_results: int) -> ChatPromptTemplate:
+    """Build the agent prompt; cached by (db_type, schema_key, max_results).
+
+    Static rules come first and the schema goes last: provider-side
+    prompt caching works on shared prefixes, so keeping the invariant
+    block strictly before the per-connection parts lets the prefill for
+    the rules be reused across databases and sessions.
+    """
+    schema = _schema
+
+    system_message = f"""You are a helpful SQL analyst assistant.
 
 Rules:
 - Only generate SELECT statements
 - Think step-by-step before writing queries
 - If you get an error, analyze it and try to fix the query
-- For listing tables, use the appropriate query for {db_type}:
+- For listing tables, use the appropriate query for the database type:
   * SQLite: SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'
   * MySQL: SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
   * PostgreSQL: SELECT tablename FROM pg_tables WHERE schemaname = 'public'
-- Limit results to {Config.MAX_QUERY_RESULTS} rows unless specifically asked for more
-- Use proper SQL syntax for {db_type}
+- When a question needs several independent queries (e.g. a count per table), call execute_sql_batch once with all of them instead of separate execute_sql calls
 - Provide clear explanations of your queries
 - If the tool returns 'Error:', revise the SQL and try again
 - Maximum 3 attempts per question
@@ -37,14 +53,23 @@ Rules:
 - IMPORTANT: When the execute_sql tool returns formatted data, include that formatted data in your response
 - Don't just say "shown above" - actually include the data tables in your response
 - Format your response to include both explanation and the actual data
-- Use markdown formatting to make tables readable"""
+- Use markdown formatting to make tables readable
+
+Database Type: {db_type.upper()}
+- Use proper SQL syntax for {db_type}
+- Limit results to {max_results} rows unless specifically asked for more
+
+{db_guidance}
+
+Database Schema:
+{schema}"""
 
-        return ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("placeholder", "{chat_history}"),
-            ("human", "{input}"),
-            ("placeholder", "{agent_scratchpad}")
-        ])
+    return ChatPromptTemplate.from_messages([
+        ("system", system_message),
+        ("placeholder", "{chat_history}"),
+        ("human", "{input}"),
+        ("placeholder", "{agent_scratchpad}")
+    ])
 
 class UIPrompts:
     """UI-related prompts and text"""
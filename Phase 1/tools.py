@@ -1,98 +1,391 @@
 """Fixed SQL execution tools for SQL Agent ChatBot with better result handling"""
+from __future__ import annotations
+import asyncio
+import csv
+import functools
+import io
 import re
 import logging
-import pandas as pd
 import ast
 import json
-from typing import Tuple, Optional, List, Any, Union
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Tuple, Optional, List, Any, Union
 from datetime import datetime
-from langchain_core.tools import tool
+from sqlalchemy import text as sa_text
+from langchain_core.tools import StructuredTool
 from langchain_community.utilities import SQLDatabase
-from config import Config
+from config import get_config
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+_pd_mod = None
+
+def _pd():
+    """Import pandas on first use.
+
+    pandas adds hundreds of ms to cold start; deferring it means module
+    import (and turns that never touch a table result) stay cheap.
+    """
+    global _pd_mod
+    if _pd_mod is None:
+        import pandas
+        _pd_mod = pandas
+    return _pd_mod
+
+# Resolved once at import; QueryLogger degrades gracefully when the module
+# is used outside a Streamlit process
+try:
+    import streamlit as st
+except ImportError:
+    st = None
 
 logger = logging.getLogger(__name__)
 
+# Optional fast JSON decoder; orjson/ujson parse several times faster than
+# stdlib json and all raise ValueError subclasses on bad input
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    try:
+        from ujson import loads as _json_loads
+    except ImportError:
+        _json_loads = json.loads
+
+# Ring size for the in-session query log shown in the sidebar
+_QUERY_LOG_MAXLEN = 50
+
+# Hard ceiling on rows materialized from any single query, regardless of
+# what the validated SQL asked for (aggregations skip the automatic LIMIT),
+# and the cursor batch size used to stream up to that ceiling
+_MAX_FETCH_ROWS = 1000
+_FETCH_BATCH_SIZE = 256
+
+# Precompiled patterns for cleaning driver result strings; compiled once at
+# import instead of per result
+_AST_OBJ_RE = re.compile(r'<ast\.\w+\s+object\s+at\s+0x[0-9a-fA-F]+>')
+_OBJECT_RE = re.compile(r'<[\w\.]+\s+object\s+at\s+0x[0-9a-fA-F]+>')
+_DECIMAL_RE = re.compile(r"Decimal\(['\"]([0-9\.]+)['\"]\)")
+_DATETIME_RE = re.compile(r'datetime\.datetime\([^)]+\)')
+_CLEAN_PATTERNS = (
+    (_AST_OBJ_RE, '"[OBJECT]"'),
+    (_OBJECT_RE, '"[OBJECT]"'),
+    (_DECIMAL_RE, r'\1'),
+    (_DATETIME_RE, '"[DATETIME]"'),
+)
+
+# A parenthesis inside a single-quoted value means the tuple→list rewrite
+# in _normalize_py_literals would corrupt data; skip the JSON fast path then
+_QUOTED_PAREN_RE = re.compile(r"'[^']*[()]")
+
+# Single-pass character rewrites (tuples→lists, quotes) plus one alternation
+# scan for the bare Python literals; chained str.replace allocated a new
+# string per substitution
+_PY_JSON_TRANS = str.maketrans({"'": '"', "(": "[", ")": "]"})
+_PY_LITERAL_RE = re.compile(r'\b(None|True|False)\b')
+_PY_LITERAL_MAP = {'None': 'null', 'True': 'true', 'False': 'false'}
+
+def _normalize_py_literals(s: str) -> str:
+    """Rewrite a Python-literal repr into (usually) valid JSON.
+
+    SQLAlchemy result reprs are lists of tuples with single quotes;
+    json.loads is roughly an order of magnitude faster than
+    ast.literal_eval, so a cheap textual normalization pays for itself.
+    """
+    return _PY_LITERAL_RE.sub(
+        lambda m: _PY_LITERAL_MAP[m.group(0)], s.translate(_PY_JSON_TRANS)
+    )
+
+# Queries matching any of these shapes should not get an automatic LIMIT;
+# a single alternation scan replaces six substring checks
+_NO_LIMIT_RE = re.compile(
+    r'information_schema\.tables|sqlite_master|pg_tables|count\(\*\)|group by|having',
+    re.I
+)
+
+# Case-insensitive SELECT-list extraction that leaves the original casing
+# of column names and aliases intact
+_SELECT_LIST_RE = re.compile(r'\bSELECT\b(.*?)\bFROM\b', re.I | re.S)
+_AGG_FUNCS = ("COUNT", "SUM", "AVG", "MIN", "MAX")
+
+# A semicolon followed by non-whitespace content marks a second statement;
+# one scan replaces the count/endswith/in triple traversal
+_MULTI_STMT_RE = re.compile(r';\s*\S')
+
+# Safety patterns; module-level so the memoized validator can use them
+_DENY_RE = re.compile(r"\b(INSERT|UPDATE|DELETE|ALTER|DROP|CREATE|REPLACE|TRUNCATE|GRANT|REVOKE)\b", re.I)
+_HAS_LIMIT_TAIL_RE = re.compile(r"(?is)\blimit\b\s+\d+(\s*,\s*\d+)?\s*;?\s*$")
+
+@functools.lru_cache(maxsize=512)
+def _safe_sql_impl(query: str, max_results: int) -> str:
+    """Validate a query and return the safe form (or an "Error: ..." sentinel).
+
+    Deterministic in (query, max_results), so repeat submissions of the
+    same exploratory queries resolve to a dict hit instead of re-running
+    the regex scans.
+    """
+    logger.info("Validating SQL query: %.100s...", query)
+
+    query = query.strip()
+
+    # Block multiple statements (trailing semicolons are tolerated)
+    if _MULTI_STMT_RE.search(query.rstrip('; \t\n')):
+        logger.warning("Blocked multiple statements")
+        return "Error: multiple statements are not allowed."
+    query = query.rstrip(";").strip()
+
+    # Read-only gate; lowercase only the prefix instead of copying the
+    # whole query, the compiled patterns below are already re.I
+    if query[:6].lower() != "select":
+        logger.warning(f"Blocked non-SELECT statement: {query[:50]}")
+        return "Error: only SELECT statements are allowed."
+    if _DENY_RE.search(query):
+        logger.warning(f"Blocked DML/DDL statement: {query[:50]}")
+        return "Error: DML/DDL detected. Only read-only queries are permitted."
+
+    # Special cases where we don't want to add LIMIT automatically
+    should_add_limit = _NO_LIMIT_RE.search(query) is None
+
+    # Add LIMIT if not present and query should have one
+    if not _HAS_LIMIT_TAIL_RE.search(query) and should_add_limit:
+        query += f" LIMIT {max_results}"
+        logger.info("Added LIMIT %s to query", max_results)
+
+    logger.info("Query validated successfully: %.200s", query)
+    return query
+
+def _df_to_markdown_fast(df: pd.DataFrame) -> str:
+    """Emit a pipe-style markdown table without going through tabulate.
+
+    to_markdown routes through tabulate, which re-measures column widths
+    and allocates intermediate lists per cell; the agent only needs valid
+    pipe markdown, so a single astype(str) + join pass is enough.
+    """
+    cols = list(map(str, df.columns))
+    arr = df.to_numpy().astype(str, copy=False)
+    # Write into one growable buffer; joining header/sep/body strings
+    # would allocate each piece twice on large frames
+    buf = io.StringIO()
+    buf.write("| " + " | ".join(cols) + " |\n")
+    buf.write("|" + "|".join("---" for _ in cols) + "|")
+    for row in arr:
+        buf.write("\n| " + " | ".join(row) + " |")
+    return buf.getvalue()
+
+def _format_rows_no_df(rows: List, columns: List[str]) -> str:
+    """Emit pipe markdown straight from row tuples, no DataFrame needed"""
+    buf = io.StringIO()
+    buf.write("| " + " | ".join(map(str, columns)) + " |\n")
+    buf.write("|" + "|".join("---" for _ in columns) + "|")
+    for r in rows:
+        buf.write("\n| " + " | ".join(map(str, r)) + " |")
+    return buf.getvalue()
+
+@dataclass(slots=True)
+class ExecResult:
+    """Structured result of a SQL execution.
+
+    Carries an explicit error flag and the executed query so callers can
+    branch in O(1) instead of prefix-scanning the (potentially large)
+    result text. `llm_text` is a row-capped variant fed back to the model;
+    `text` keeps the full result for UI display; `df` keeps the natively
+    fetched DataFrame (with real column names) so the UI can render rows
+    without re-parsing the formatted string.
+    """
+    text: str
+    is_error: bool
+    query: str
+    row_count: int = -1
+    llm_text: str = ""
+    df: Any = None
+
 class SQLExecutor:
     """SQL query execution with safety checks and improved result handling"""
-    
+
+    # Fixed attribute set; slots drop the per-instance __dict__ and make
+    # attribute lookups a descriptor hit (the safety patterns live at
+    # module scope, so they aren't per-instance state)
+    __slots__ = ('db', 'db_type', 'recent_results', 'use_native_fetch')
+
     def __init__(self, db: SQLDatabase, db_type: str):
         self.db = db
         self.db_type = db_type
-        
-        # Safety patterns
-        self.deny_re = re.compile(r"\b(INSERT|UPDATE|DELETE|ALTER|DROP|CREATE|REPLACE|TRUNCATE|GRANT|REVOKE)\b", re.I)
-        self.has_limit_tail_re = re.compile(r"(?is)\blimit\b\s+\d+(\s*,\s*\d+)?\s*;?\s*$")
+
+        # Most recent ExecResult per raw query, so the agent can look up
+        # error status without re-scanning observation strings
+        self.recent_results: dict = {}
+
+        # Fetch rows natively via the engine when possible; db.run returns a
+        # stringified list that we would immediately have to re-parse. Set
+        # False for adapters that only expose run().
+        self.use_native_fetch = getattr(db, '_engine', None) is not None
     
     def _safe_sql(self, query: str, max_results: int = None) -> str:
-        """Ensure SQL query is safe for execution"""
+        """Ensure SQL query is safe for execution (memoized per query)"""
         if max_results is None:
-            max_results = Config.MAX_QUERY_RESULTS
-            
-        logger.info(f"Validating SQL query: {query[:100]}...")
-        
-        query = query.strip()
-        
-        # Block multiple statements
-        if query.count(";") > 1 or (query.endswith(";") and ";" in query[:-1]):
-            logger.warning("Blocked multiple statements")
-            return "Error: multiple statements are not allowed."
-        query = query.rstrip(";").strip()
-
-        # Read-only gate
-        if not query.lower().startswith("select"):
-            logger.warning(f"Blocked non-SELECT statement: {query[:50]}")
-            return "Error: only SELECT statements are allowed."
-        if self.deny_re.search(query):
-            logger.warning(f"Blocked DML/DDL statement: {query[:50]}")
-            return "Error: DML/DDL detected. Only read-only queries are permitted."
-
-        # Special cases where we don't want to add LIMIT automatically
-        no_limit_patterns = [
-            "information_schema.tables",
-            "sqlite_master",
-            "pg_tables",
-            "count(*)",
-            "group by",
-            "having"
-        ]
-        
-        should_add_limit = not any(pattern in query.lower() for pattern in no_limit_patterns)
-        
-        # Add LIMIT if not present and query should have one
-        if not self.has_limit_tail_re.search(query) and should_add_limit:
-            query += f" LIMIT {max_results}"
-            logger.info(f"Added LIMIT {max_results} to query")
-        
-        logger.info(f"Query validated successfully: {query}")
-        return query
+            max_results = get_config().max_query_results
+
+        validated = _safe_sql_impl(query, max_results)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("safe_sql cache: %s", _safe_sql_impl.cache_info())
+        return validated
     
     def execute_query(self, query: str) -> str:
-        """Execute a READ-ONLY SQL query and return results"""
-        logger.info(f"Executing SQL query: {query}")
-        
+        """Execute a READ-ONLY SQL query and return results as text"""
+        return self.execute_query_ex(query).text
+
+    def execute_query_ex(self, query: str) -> ExecResult:
+        """Execute a READ-ONLY SQL query and return a structured result"""
+        logger.info("Executing SQL query: %.200s", query)
+
         safe_query = self._safe_sql(query)
         if safe_query.startswith("Error:"):
-            return safe_query
-        
+            return self._record(query, ExecResult(safe_query, True, query))
+
         try:
-            # Execute the query and get raw result
-            result = self.db.run(safe_query)
-            logger.info(f"Raw result type: {type(result)}")
-            logger.info(f"Raw result preview: {str(result)[:200]}...")
-            
-            # Handle the result based on its type
-            formatted_result = self._handle_query_result(result, safe_query)
-            
-            logger.info(f"Query executed successfully. Formatted result length: {len(formatted_result)}")
-            
-            # Return formatted result with query
-            return f"QUERY: {safe_query}\n\nRESULT:\n{formatted_result}"
-            
+            df = None
+            if self.use_native_fetch:
+                # Stream rows straight from the cursor into a DataFrame;
+                # column names come from the cursor description, and the
+                # format→string→re-parse round trip of db.run is skipped
+                df = self._fetch_dataframe(safe_query)
+                row_count = len(df)
+                if df.empty:
+                    formatted_result = "No data returned"
+                    df = None
+                else:
+                    formatted_result = self._format_dataframe_result(df)
+            else:
+                # Legacy path for adapters that only expose run()
+                result = self.db.run(safe_query)
+                logger.info("Raw result type: %s", type(result))
+                logger.info("Raw result preview: %.200s...", result)
+
+                row_count = len(result) if isinstance(result, list) else -1
+
+                # Handle the result based on its type
+                formatted_result = self._handle_query_result(result, safe_query)
+
+            logger.info("Query executed successfully. Formatted result length: %d", len(formatted_result))
+
+            # Full result for UI display; row-capped variant for the LLM.
+            # Agent iterations re-send all prior observations, so feeding
+            # the model an uncapped table multiplies prompt tokens.
+            text = f"QUERY: {safe_query}\n\nRESULT:\n{formatted_result}"
+            llm_result = self._truncate_for_llm(formatted_result)
+            llm_text = f"QUERY: {safe_query}\n\nRESULT:\n{llm_result}"
+            return self._record(query, ExecResult(text, False, safe_query, row_count, llm_text, df))
+
         except Exception as e:
             error_msg = f"Error: {e}"
             logger.error(f"Query execution failed: {e}")
-            return error_msg
+            return self._record(query, ExecResult(error_msg, True, safe_query))
+
+    def _fetch_dataframe(self, safe_query: str, conn=None) -> pd.DataFrame:
+        """Fetch a validated query's rows natively into a DataFrame.
+
+        Rows stream from the cursor in fixed-size batches and stop at a
+        hard ceiling, so a query without a LIMIT (aggregations skip the
+        automatic one) can't materialize an unbounded result set.
+        """
+        logger.info("Fetching rows natively for: %.100s", safe_query)
+        if conn is not None:
+            return self._fetch_capped(safe_query, conn)
+        with self.db._engine.connect() as shared:
+            return self._fetch_capped(safe_query, shared)
+
+    def _fetch_capped(self, safe_query: str, conn) -> pd.DataFrame:
+        """Stream up to _MAX_FETCH_ROWS rows over an open connection"""
+        result = conn.execution_options(stream_results=True).execute(
+            sa_text(safe_query)
+        )
+        try:
+            rows = []
+            while len(rows) < _MAX_FETCH_ROWS:
+                batch = result.fetchmany(_FETCH_BATCH_SIZE)
+                if not batch:
+                    break
+                rows.extend(batch)
+            else:
+                logger.warning(
+                    "Result capped at %d rows for: %.100s",
+                    _MAX_FETCH_ROWS, safe_query
+                )
+            return _pd().DataFrame(rows[:_MAX_FETCH_ROWS],
+                                   columns=list(result.keys()))
+        finally:
+            result.close()
+
+    def _truncate_for_llm(self, formatted: str, max_rows: int = None) -> str:
+        """Cap a formatted result to max_rows data lines for prompt reuse"""
+        if max_rows is None:
+            max_rows = get_config().max_query_results
+
+        # Keep the header and separator lines of markdown tables plus
+        # max_rows data rows
+        limit = max_rows + 2
+        lines = formatted.split('\n')
+        if len(lines) <= limit:
+            return formatted
+        truncated = lines[:limit]
+        truncated.append(f"... {len(lines) - limit} more rows (truncated for the model; full result shown in the UI)")
+        return '\n'.join(truncated)
+
+    def _record(self, raw_query: str, result: ExecResult) -> ExecResult:
+        """Remember the latest result for a raw query (bounded)"""
+        if not result.llm_text:
+            result.llm_text = result.text
+        if len(self.recent_results) > 64:
+            self.recent_results.clear()
+        self.recent_results[raw_query] = result
+        return result
     
+    def batch_execute_query(self, queries: List[str]) -> List[ExecResult]:
+        """Execute several read-only queries over one shared connection.
+
+        Per-query overhead (connection acquisition, framework setup) is
+        paid once for the whole batch instead of per call; validation
+        reuses the precompiled patterns per query.
+        """
+        if not self.use_native_fetch:
+            return [self.execute_query_ex(q) for q in queries]
+
+        results: List[ExecResult] = []
+        safe_queries = [self._safe_sql(q) for q in queries]
+        with self.db._engine.connect() as conn:
+            for query, safe_query in zip(queries, safe_queries):
+                if safe_query.startswith("Error:"):
+                    results.append(self._record(query, ExecResult(safe_query, True, query)))
+                    continue
+                try:
+                    df = self._fetch_dataframe(safe_query, conn)
+                    formatted = "No data returned" if df.empty else self._format_dataframe_result(df)
+                    text = f"QUERY: {safe_query}\n\nRESULT:\n{formatted}"
+                    llm_text = f"QUERY: {safe_query}\n\nRESULT:\n{self._truncate_for_llm(formatted)}"
+                    results.append(self._record(
+                        query, ExecResult(text, False, safe_query, len(df), llm_text,
+                                          df if not df.empty else None)
+                    ))
+                except Exception as e:
+                    logger.error("Query execution failed: %s", e)
+                    results.append(self._record(query, ExecResult(f"Error: {e}", True, safe_query)))
+        return results
+
+    async def aexecute_query_ex(self, query: str) -> ExecResult:
+        """Async wrapper around `execute_query_ex` (DB I/O runs in a thread)."""
+        return await asyncio.to_thread(self.execute_query_ex, query)
+
+    async def aexecute_many(self, queries: List[str]) -> List[ExecResult]:
+        """Execute independent queries concurrently (the async batch path).
+
+        Questions like "how many rows in each table?" decompose into N
+        independent SELECTs; running them through `asyncio.gather` overlaps
+        the DB round trips (each on its own pooled connection) instead of
+        serializing them the way the sync shared-connection batch does.
+        """
+        return list(await asyncio.gather(*(self.aexecute_query_ex(q) for q in queries)))
+
     def _handle_query_result(self, result: Any, query: str) -> str:
         """Handle different types of query results"""
         try:
@@ -122,24 +415,48 @@ class SQLExecutor:
         try:
             if not result:
                 return "No data returned"
-            
-            # Convert to DataFrame for better formatting
-            df = pd.DataFrame(result)
-            
+
+            # Fast path: single scalar (COUNT/MAX/etc.), the most common
+            # agent query shape — skip pandas/tabulate entirely
+            if len(result) == 1 and hasattr(result[0], '__len__') and len(result[0]) == 1:
+                return f"Result: {result[0][0]}"
+
+            # Fast path: tiny results are joined directly; a DataFrame
+            # plus tabulate is overkill for a handful of rows
+            if len(result) <= 4 and all(isinstance(r, (tuple, list)) for r in result):
+                num_cols = len(result[0])
+                if all(len(r) == num_cols for r in result):
+                    columns = self._extract_column_names_from_query(query, num_cols) \
+                        or [f"Column_{i+1}" for i in range(num_cols)]
+                    header = " | ".join(columns)
+                    lines = [header, "-" * len(header)]
+                    lines.extend(" | ".join(map(str, r)) for r in result)
+                    return "\n".join(lines)
+
+            # Uniform row tuples are emitted as markdown directly;
+            # pd.DataFrame(list_of_tuples) runs per-cell type inference we
+            # don't need just to render strings
+            if all(isinstance(r, (tuple, list)) for r in result):
+                num_cols = len(result[0])
+                if all(len(r) == num_cols for r in result):
+                    columns = self._extract_column_names_from_query(query, num_cols) \
+                        or [f"Column_{i+1}" for i in range(num_cols)]
+                    return _format_rows_no_df(result, columns)
+
+            # Ragged or unusual data: let pandas normalize it
+            df = _pd().DataFrame(result)
+
             # Try to get column names from the query
             column_names = self._extract_column_names_from_query(query, len(df.columns))
             if column_names:
                 df.columns = column_names
             else:
                 df.columns = [f"Column_{i+1}" for i in range(len(df.columns))]
-            
+
             # Format as markdown table
-            try:
-                return df.to_markdown(index=False, tablefmt='pipe')
-            except ImportError:
-                # Fallback if tabulate is not available
-                return self._format_dataframe_basic(df)
-                
+            return _df_to_markdown_fast(df)
+
+
         except Exception as e:
             logger.error(f"Error formatting list result: {e}")
             # Fallback to simple string representation
@@ -151,8 +468,17 @@ class SQLExecutor:
     def _parse_string_result(self, result_str: str, query: str) -> str:
         """Parse string result with multiple strategies"""
         try:
-            # Strategy 1: Try to evaluate as Python literal
+            # Strategy 1: normalize the Python literal to JSON and parse
+            # with json.loads (much faster than ast); fall back to
+            # ast.literal_eval only when that fails or would be unsafe
             if result_str.startswith("[") and result_str.endswith("]"):
+                if not _QUOTED_PAREN_RE.search(result_str):
+                    try:
+                        data = _json_loads(_normalize_py_literals(result_str))
+                        return self._format_list_result(data, query)
+                    except (ValueError, TypeError):
+                        pass
+
                 try:
                     # Clean the string of any problematic content
                     cleaned_str = self._clean_result_string(result_str)
@@ -160,12 +486,12 @@ class SQLExecutor:
                     return self._format_list_result(data, query)
                 except (ValueError, SyntaxError) as e:
                     logger.warning(f"ast.literal_eval failed: {e}")
-            
+
             # Strategy 2: Try JSON parsing
             try:
-                data = json.loads(result_str)
+                data = _json_loads(result_str)
                 return self._format_list_result(data, query)
-            except json.JSONDecodeError:
+            except (ValueError, TypeError):
                 logger.warning("JSON parsing failed")
             
             # Strategy 3: Parse as delimited text
@@ -183,25 +509,11 @@ class SQLExecutor:
     def _clean_result_string(self, result_str: str) -> str:
         """Clean result string of problematic content"""
         try:
-            # Remove any ast.Call objects or similar problematic content
-            import re
-            
-            # Pattern to match problematic AST objects
-            ast_pattern = r'<ast\.\w+\s+object\s+at\s+0x[0-9a-fA-F]+>'
-            cleaned = re.sub(ast_pattern, '"[OBJECT]"', result_str)
-            
-            # Additional cleaning patterns
-            patterns_to_clean = [
-                (r'<[\w\.]+\s+object\s+at\s+0x[0-9a-fA-F]+>', '"[OBJECT]"'),
-                (r'Decimal\([\'"]([0-9\.]+)[\'"]\)', r'\1'),  # Handle Decimal objects
-                (r'datetime\.datetime\([^)]+\)', '"[DATETIME]"'),  # Handle datetime objects
-            ]
-            
-            for pattern, replacement in patterns_to_clean:
-                cleaned = re.sub(pattern, replacement, cleaned)
-            
+            cleaned = result_str
+            for pattern, replacement in _CLEAN_PATTERNS:
+                cleaned = pattern.sub(replacement, cleaned)
             return cleaned
-            
+
         except Exception as e:
             logger.warning(f"Error cleaning result string: {e}")
             return result_str
@@ -209,29 +521,25 @@ class SQLExecutor:
     def _parse_delimited_text(self, lines: List[str], query: str) -> str:
         """Parse delimited text into table format"""
         try:
+            # Sniff the delimiter once from the first non-empty line, then
+            # let the C-implemented csv reader tokenize everything (it also
+            # handles quoted fields, which naive splitting did not)
+            sample = next((line for line in lines if line.strip()), None)
+            if sample is None:
+                return "No valid data found"
+            delim = max(('\t', '|', ','), key=sample.count)
+
             data = []
-            for line in lines:
-                if line.strip():
-                    # Try different delimiters
-                    if '\t' in line:
-                        row = line.split('\t')
-                    elif '|' in line:
-                        row = line.split('|')
-                    elif ',' in line:
-                        row = line.split(',')
-                    else:
-                        row = [line]
-                    
-                    # Clean up the row
-                    row = [cell.strip() for cell in row if cell.strip()]
-                    if row:
-                        data.append(row)
-            
+            for row in csv.reader(filter(str.strip, lines), delimiter=delim):
+                row = [cell.strip() for cell in row if cell.strip()]
+                if row:
+                    data.append(row)
+
             if data:
                 return self._format_list_result(data, query)
             else:
                 return "No valid data found"
-                
+
         except Exception as e:
             logger.error(f"Error parsing delimited text: {e}")
             return "\n".join(lines)
@@ -239,9 +547,10 @@ class SQLExecutor:
     def _format_dataframe_result(self, df) -> str:
         """Format DataFrame result"""
         try:
-            return df.to_markdown(index=False, tablefmt='pipe')
-        except ImportError:
-            return self._format_dataframe_basic(df)
+            # Scalar results skip the markdown machinery
+            if df.shape == (1, 1):
+                return f"Result: {df.iat[0, 0]}"
+            return _df_to_markdown_fast(df)
         except Exception as e:
             logger.error(f"Error formatting DataFrame: {e}")
             return str(df)
@@ -249,77 +558,144 @@ class SQLExecutor:
     def _format_dataframe_basic(self, df: pd.DataFrame) -> str:
         """Basic DataFrame formatting without tabulate dependency"""
         try:
-            lines = []
-            
-            # Header
-            header = " | ".join(str(col) for col in df.columns)
-            lines.append(header)
-            lines.append("-" * len(header))
-            
-            # Data rows (limit to first 20 rows)
-            for _, row in df.head(20).iterrows():
-                row_str = " | ".join(str(val) for val in row)
-                lines.append(row_str)
-            
+            # One shared markdown emitter; keep the 20-row display cap
+            out = _df_to_markdown_fast(df.head(20))
             if len(df) > 20:
-                lines.append(f"... and {len(df) - 20} more rows")
-            
-            return "\n".join(lines)
-            
+                out += f"\n... and {len(df) - 20} more rows"
+            return out
+
         except Exception as e:
             logger.error(f"Error in basic DataFrame formatting: {e}")
             return str(df)
     
     def _extract_column_names_from_query(self, query: str, num_columns: int) -> Optional[List[str]]:
-        """Extract column names from SQL query"""
-        try:
-            query_upper = query.upper()
-            if "SELECT" in query_upper and "FROM" in query_upper:
-                select_part = query_upper.split("FROM")[0].replace("SELECT", "").strip()
-                
-                if select_part == "*":
-                    return None  # Will use generic names
-                else:
-                    # Extract column names
-                    columns = []
-                    for col in select_part.split(","):
-                        col = col.strip()
-                        # Handle aliases (AS keyword)
-                        if " AS " in col:
-                            col = col.split(" AS ")[1].strip()
-                        # Handle simple aliases (space)
-                        elif " " in col and not any(func in col for func in ["COUNT", "SUM", "AVG", "MIN", "MAX"]):
-                            parts = col.split()
-                            col = parts[-1]
-                        columns.append(col)
-                    
-                    # Return only if we have the right number of columns
-                    if len(columns) == num_columns:
-                        return columns
-            
-            return None
-            
-        except Exception as e:
-            logger.warning(f"Error extracting column names: {e}")
+        """Extract column names from SQL query (memoized per query string)"""
+        columns = _extract_column_names(query, num_columns)
+        return list(columns) if columns is not None else None
+
+@functools.lru_cache(maxsize=256)
+def _extract_column_names(query: str, num_columns: int) -> Optional[Tuple[str, ...]]:
+    """Parse the SELECT list of a query into column names.
+
+    Chat agents re-issue the same exploratory queries constantly, so the
+    per-call .upper()/split work is memoized on (query, num_columns); the
+    tuple return keeps the cached value hashable and immutable.
+    """
+    try:
+        # Locate the SELECT list case-insensitively but keep the original
+        # text: the old full-query .upper() returned aliases UPPERCASED,
+        # corrupting downstream table headers
+        m = _SELECT_LIST_RE.search(query)
+        if not m:
             return None
 
+        select_part = m.group(1).strip()
+        if select_part == "*":
+            return None  # Will use generic names
+
+        # Extract column names
+        columns = []
+        for col in select_part.split(","):
+            col = col.strip()
+            col_upper = col.upper()
+            # Handle aliases (AS keyword)
+            if " AS " in col_upper:
+                col = col[col_upper.index(" AS ") + 4:].strip()
+            # Handle simple aliases (space)
+            elif " " in col and not any(func in col_upper for func in _AGG_FUNCS):
+                col = col.split()[-1]
+            columns.append(col)
+
+        # Return only if we have the right number of columns
+        if len(columns) == num_columns:
+            return tuple(columns)
+
+        return None
+
+    except Exception as e:
+        logger.warning(f"Error extracting column names: {e}")
+        return None
+
 def create_sql_tool(sql_executor: SQLExecutor):
     """Create the SQL execution tool"""
-    
-    @tool
+
     def execute_sql(query: str) -> str:
-        """Execute a READ-ONLY SQL query and return results."""
-        return sql_executor.execute_query(query)
-    
-    return execute_sql
+        # The model sees the row-capped text; the full result stays
+        # available via sql_executor.recent_results for UI display
+        return sql_executor.execute_query_ex(query).llm_text
+
+    async def aexecute_sql(query: str) -> str:
+        # Offload the blocking DB round trip so the agent's event loop
+        # can keep streaming LLM tokens while the query runs
+        return await asyncio.to_thread(execute_sql, query)
+
+    return StructuredTool.from_function(
+        func=execute_sql,
+        coroutine=aexecute_sql,
+        name="execute_sql",
+        description="Execute a READ-ONLY SQL query and return results.",
+    )
+
+def create_sql_batch_tool(sql_executor: SQLExecutor):
+    """Create the batched SQL execution tool"""
+
+    def execute_sql_batch(queries: List[str]) -> str:
+        results = sql_executor.batch_execute_query(queries)
+        return "\n\n".join(r.llm_text for r in results)
+
+    async def aexecute_sql_batch(queries: List[str]) -> str:
+        # Async agent runs overlap the independent round trips through
+        # the pool; the sync path above keeps its single shared connection
+        results = await sql_executor.aexecute_many(queries)
+        return "\n\n".join(r.llm_text for r in results)
+
+    return StructuredTool.from_function(
+        func=execute_sql_batch,
+        coroutine=aexecute_sql_batch,
+        name="execute_sql_batch",
+        description=(
+            "Execute several independent READ-ONLY SQL queries in one call. "
+            "Prefer this over repeated execute_sql calls when the answers to "
+            "multiple unrelated queries are needed (e.g. a count per table)."
+        ),
+    )
+
+def create_schema_tool(schema_index: dict):
+    """Create the on-demand table schema lookup tool.
+
+    Used for wide databases where the system prompt carries only the
+    table list (see agent.build_executor): the agent fetches DDL for just
+    the tables a question touches instead of every prompt paying for the
+    full schema dump.
+    """
+    from database import schema_for_tables
+
+    def describe_tables(tables: List[str]) -> str:
+        result = schema_for_tables(schema_index, tables)
+        return result if result else "No matching tables found."
+
+    async def adescribe_tables(tables: List[str]) -> str:
+        # Pure dict lookups; no need to leave the event loop
+        return describe_tables(tables)
+
+    return StructuredTool.from_function(
+        func=describe_tables,
+        coroutine=adescribe_tables,
+        name="describe_tables",
+        description=(
+            "Get the CREATE TABLE definitions (columns and types) for the "
+            "named tables. Call this before writing SQL against tables "
+            "whose columns you do not already know."
+        ),
+    )
 
 class QueryLogger:
     """Handle query logging for debugging and monitoring"""
     
     @staticmethod
-    def log_query_execution(query: str, result: str, db_type: str, error: bool = False):
-        """Log query execution details"""
-        log_entry = {
+    def _build_entry(query: str, result: str, db_type: str, error: bool) -> dict:
+        """Build a single log entry dict"""
+        return {
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "query": query,
             "result_preview": result[:200] + "..." if len(result) > 200 else result,
@@ -327,32 +703,68 @@ class QueryLogger:
             "error": error,
             "db_type": db_type
         }
-        
+
+    @staticmethod
+    def _append_logs(entries: List[dict]):
+        """Append entries to the session-state log ring.
+
+        A deque(maxlen=50) evicts old entries in O(1) per append, instead
+        of the list-slice rebuild the old cap check did on every call.
+        Pre-deque lists (from older session state) are converted in place.
+        """
+        if st is None or "query_logs" not in st.session_state:
+            return
+        logs = st.session_state.query_logs
+        if not isinstance(logs, deque):
+            logs = deque(logs, maxlen=_QUERY_LOG_MAXLEN)
+            st.session_state.query_logs = logs
+        logs.extend(entries)
+
+    @staticmethod
+    def log_batch(executions: List[Tuple[str, str, str, bool]]):
+        """Log a batch of (query, result, db_type, error) executions at once.
+
+        Multi-step agent runs used to hit session state once per
+        intermediate step; batching does a single session-state update.
+        The log records only enqueue here — the QueueListener thread
+        (see main.setup_logging) owns the file/stream handlers and their
+        flushing.
+        """
+        if not executions:
+            return
+
+        entries = [QueryLogger._build_entry(*e) for e in executions]
+
+        # Add to session state for frontend display (single update)
+        QueryLogger._append_logs(entries)
+
+        for query, result, db_type, error in executions:
+            if error:
+                logger.error("Query failed: %.200s | Error: %.500s", query, result)
+            else:
+                logger.info("Query executed successfully: %.200s | Result length: %d", query, len(result))
+
+    @staticmethod
+    def log_query_execution(query: str, result: str, db_type: str, error: bool = False):
+        """Log query execution details"""
+        log_entry = QueryLogger._build_entry(query, result, db_type, error)
+
         # Add to session state for frontend display
-        try:
-            import streamlit as st
-            if "query_logs" in st.session_state:
-                st.session_state.query_logs.append(log_entry)
-                # Keep only last 50 queries
-                if len(st.session_state.query_logs) > 50:
-                    st.session_state.query_logs = st.session_state.query_logs[-50:]
-        except ImportError:
-            # If streamlit is not available, just log to console
-            pass
-        
+        QueryLogger._append_logs([log_entry])
+
         # Log to console/file
         if error:
-            logger.error(f"Query failed: {query} | Error: {result}")
+            logger.error("Query failed: %.200s | Error: %.500s", query, result)
         else:
-            logger.info(f"Query executed successfully: {query} | Result length: {len(result)}")
+            logger.info("Query executed successfully: %.200s | Result length: %d", query, len(result))
 
 # Alternative direct result formatting function for immediate use
 def format_query_result_direct(result: Any, query: str = "") -> str:
     """Direct formatting function that can handle various result types"""
     try:
         # Log the result type and content for debugging
-        logger.info(f"Formatting result of type: {type(result)}")
-        logger.info(f"Result content preview: {str(result)[:100]}...")
+        logger.info("Formatting result of type: %s", type(result))
+        logger.info("Result content preview: %.100s...", result)
         
         # Handle list results (most common)
         if isinstance(result, list):
@@ -361,29 +773,17 @@ def format_query_result_direct(result: Any, query: str = "") -> str:
             
             # Try to create a DataFrame
             try:
-                df = pd.DataFrame(result)
-                
+                df = _pd().DataFrame(result)
+
                 # Simple column naming
                 df.columns = [f"Column_{i+1}" for i in range(len(df.columns))]
-                
-                # Format as simple table
-                lines = []
-                
-                # Header
-                header = " | ".join(df.columns)
-                lines.append(header)
-                lines.append("-" * len(header))
-                
-                # Data rows (limit to 20)
-                for _, row in df.head(20).iterrows():
-                    row_str = " | ".join(str(val) for val in row)
-                    lines.append(row_str)
-                
+
+                # Shared markdown emitter, capped at 20 rows for display
+                out = _df_to_markdown_fast(df.head(20))
                 if len(df) > 20:
-                    lines.append(f"... and {len(df) - 20} more rows")
-                
-                return "\n".join(lines)
-                
+                    out += f"\n... and {len(df) - 20} more rows"
+                return out
+
             except Exception as e:
                 logger.warning(f"DataFrame creation failed: {e}")
                 # Fallback to simple list formatting
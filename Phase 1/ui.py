@@ -2,14 +2,84 @@
 import streamlit as st
 import tempfile
 import os
+import hashlib
+from collections import deque
+from itertools import islice
 import pandas as pd
 import ast
 import re
 from typing import List, Dict, Any
-from config import Config
-from database import DatabaseConfig
+from config import get_config
+from database import (create_mysql_connection, create_postgresql_connection,
+                      create_sqlite_connection)
 from agent import SQLAgent  # Use the fixed agent
 from prompts import UIPrompts
+from tools import _json_loads, _normalize_py_literals, _QUOTED_PAREN_RE
+
+# Precompiled pattern for splitting tool output into query/result parts;
+# compiled once instead of re-splitting strings per historical message
+_QUERY_RESULT_RE = re.compile(r"QUERY:\s*(.*?)\s*RESULT:\s*(.*)", re.S)
+
+# Results longer than this skip the table parsers entirely; parsing a
+# multi-megabyte repr just to render it would stall the UI thread
+_MAX_PARSE_LEN = 1_000_000
+
+def extract_result_part(output: str):
+    """Return the RESULT: section of a tool output, or None.
+
+    find + slice instead of a regex capture: the marker scan is a plain
+    memchr-style search and only the tail is copied once.
+    """
+    idx = output.find("RESULT:")
+    if idx == -1:
+        return None
+    return output[idx + len("RESULT:"):].strip()
+
+@st.cache_data(show_spinner=False)
+def _config_snapshot():
+    """Return (config dict, validation dict), computed once per session.
+
+    Environment variables don't change while the app is running, but the
+    sidebar re-renders on every rerun and three components each rebuilt
+    these dicts independently.
+    """
+    app_config = get_config()
+    return app_config.to_dict(), app_config.validate()
+
+# Patterns for rewriting driver value reprs into literals ast can evaluate
+_TUPLE_DECIMAL_RE = re.compile(r"Decimal\('([^']+)'\)")
+_TUPLE_DATETIME_RE = re.compile(r"datetime\.datetime\([^)]+\)")
+_TUPLE_OBJECT_RE = re.compile(r"<[^>]+>")
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _parse_result_df(result_text: str):
+    """Parse a stringified tuple list into a named DataFrame, or None.
+
+    Every widget interaction reruns the script and re-renders chat
+    history, so without caching the same result string went through the
+    regex cleanup and ast.literal_eval on each rerun.
+    """
+    cleaned = _TUPLE_DECIMAL_RE.sub(r"\1", result_text)
+    cleaned = _TUPLE_DATETIME_RE.sub("'[DATETIME]'", cleaned)
+    cleaned = _TUPLE_OBJECT_RE.sub("'[OBJECT]'", cleaned)
+
+    # JSON fast path: same normalization tools.py uses for driver reprs;
+    # json parses large dumps an order of magnitude faster than
+    # ast.literal_eval. Parenthesized values would corrupt the rewrite,
+    # so those (and anything else malformed) fall back to ast.
+    data = None
+    if not _QUOTED_PAREN_RE.search(cleaned):
+        try:
+            data = _json_loads(_normalize_py_literals(cleaned))
+        except (ValueError, TypeError):
+            data = None
+    if data is None:
+        data = ast.literal_eval(cleaned)
+    if isinstance(data, list) and data:
+        df = pd.DataFrame(data)
+        df.columns = [f"Column_{i+1}" for i in range(len(df.columns))]
+        return df
+    return None
 
 class DatabaseUI:
     """Database configuration UI components"""
@@ -17,8 +87,7 @@ class DatabaseUI:
     @staticmethod
     def show_environment_status():
         """Display environment variables status"""
-        config = Config.to_dict()
-        validation = Config.validate()
+        config, validation = _config_snapshot()
         
         with st.expander("🔧 Environment Status", expanded=False):
             st.write("**Environment Variables Status:**")
@@ -32,57 +101,90 @@ class DatabaseUI:
                 st.write(f"🐘 PostgreSQL Config: {config['postgres_user']}@{config['postgres_host']}:{config['postgres_port']}")
     
     @staticmethod
+    @st.fragment(run_every="5s")
     def show_query_logs():
-        """Display query execution logs"""
-        if st.session_state.get("query_logs", []):
-            with st.expander("📊 Query Logs", expanded=False):
-                for i, log in enumerate(reversed(st.session_state.query_logs[-10:])):  # Show last 10
-                    status = "❌" if log['error'] else "✅"
-                    st.write(f"{status} **{log['timestamp']}**")
-                    st.code(log['query'], language="sql")
-                    if log['error']:
-                        st.error(log['result_preview'])
-                    else:
-                        st.success(f"Result: {log['result_length']} chars")
-                    st.divider()
+        """Display query execution logs.
+
+        Runs as a fragment so typing elsewhere (e.g. the chat input)
+        doesn't re-render the log panel, and bails out before creating any
+        widget containers when there are no logs. Chat turns rerun only
+        the chat fragment and can't reach into this one, so the panel
+        polls on run_every to pick up entries written during a pure chat
+        session; the rerun is scoped to this panel and the body is a
+        session-state read plus one markdown block, so the tick is cheap.
+        """
+        if not st.session_state.get("query_logs"):
+            return
+
+        with st.expander("📊 Query Logs", expanded=False):
+            # Show last 10, newest first; deques iterate backwards in
+            # O(1) per step, so islice(reversed(...)) avoids copying the
+            # whole ring just to take the head. Built as one markdown
+            # block: each element call is a separate message to the
+            # browser, and five per entry added up
+            entries = []
+            for log in islice(reversed(st.session_state.query_logs), 10):
+                status = "❌" if log['error'] else "✅"
+                tail = log['result_preview'] if log['error'] \
+                    else f"Result: {log['result_length']} chars"
+                entries.append(
+                    f"{status} **{log['timestamp']}**\n\n"
+                    f"```sql\n{log['query']}\n```\n\n{tail}"
+                )
+            st.markdown("\n\n---\n\n".join(entries))
     
     @staticmethod
-    def render_database_config():
-        """Render database configuration form"""
-        config = Config.to_dict()
-        validation = Config.validate()
-        
+    def render_db_type_select() -> str:
+        """Render the database type selector.
+
+        Kept outside the connection form so switching types immediately
+        swaps the rendered connection fields.
+        """
+        return st.selectbox("Database Type", ["SQLite", "MySQL", "PostgreSQL"])
+
+    @staticmethod
+    def render_sqlite_source_select(db_type: str):
+        """Render the SQLite source radio for SQLite connections.
+
+        Kept outside the connection form, like the type selector, so
+        toggling between upload and file path swaps the rendered widget
+        immediately instead of after a form submit.
+        """
+        if db_type != "SQLite":
+            return None
+        return st.radio("SQLite Source", ["Upload .db file", "Enter file path"])
+
+    @staticmethod
+    def render_database_config(db_type: str, sqlite_source: str = None):
+        """Render database configuration form fields for the chosen type"""
+        config, validation = _config_snapshot()
+
         # Groq API Key status
         if not validation['groq_api_key']:
             st.error("❌ Groq API Key not found in environment variables")
             st.info("Please set GROQ_API_KEY in your .env file")
         else:
             st.success("✅ Groq API Key loaded from environment")
-        
-        # Database type selection
-        db_type = st.selectbox("Database Type", ["SQLite", "MySQL", "PostgreSQL"])
-        
+
         connection_config = None
-        
+
         if db_type == "SQLite":
-            connection_config = DatabaseUI._render_sqlite_config()
+            connection_config = DatabaseUI._render_sqlite_config(sqlite_source)
         elif db_type == "MySQL":
             connection_config = DatabaseUI._render_mysql_config(config, validation)
         elif db_type == "PostgreSQL":
             connection_config = DatabaseUI._render_postgresql_config(config, validation)
-        
-        return db_type, connection_config, validation['groq_api_key']
+
+        return connection_config, validation['groq_api_key']
     
     @staticmethod
-    def _render_sqlite_config():
-        """Render SQLite configuration"""
+    def _render_sqlite_config(sqlite_source: str):
+        """Render SQLite configuration (source radio rendered by caller)"""
         st.subheader("SQLite Configuration")
-        
-        sqlite_option = st.radio("SQLite Source", ["Upload .db file", "Enter file path"])
-        
+
         db_file_path = None
-        
-        if sqlite_option == "Upload .db file":
+
+        if sqlite_source == "Upload .db file":
             uploaded_file = st.file_uploader(
                 "Upload SQLite database file",
                 type=["db", "sqlite", "sqlite3"]
@@ -150,38 +252,83 @@ class ChatUI:
     
     @staticmethod
     def display_execution_details(execution_details: List[Dict]):
-        """Display execution details in the frontend with enhanced table rendering"""
-        if execution_details:
-            with st.expander("🔍 Execution Details", expanded=False):
-                for i, detail in enumerate(execution_details):
-                    st.write(f"**Step {i+1}: {detail['tool']}**")
-                    
-                    if detail['tool'] == 'execute_sql':
-                        ChatUI._display_sql_execution_enhanced(detail)
-                    
-                    st.divider()
+        """Display execution details in the frontend with enhanced table rendering.
+
+        The expander body only runs while it is open; collapsed (the
+        common case) the per-step result parsing is skipped entirely on
+        reruns instead of executing invisibly.
+        """
+        if not execution_details:
+            return
+
+        digest = hashlib.blake2b(
+            "".join(d.get('output', '') for d in execution_details).encode(),
+            digest_size=6,
+        ).hexdigest()
+        try:
+            exp = st.expander(
+                "🔍 Execution Details", expanded=False,
+                on_change="rerun", key=f"exec_details_{digest}",
+            )
+        except Exception:
+            # Same details rendered twice in one run (cached answers can
+            # share a details list); render the plain eager expander
+            ChatUI._display_execution_details_eager(execution_details)
+            return
+
+        if exp.open:
+            with exp:
+                ChatUI._render_execution_steps(execution_details)
+
+    @staticmethod
+    def _display_execution_details_eager(execution_details: List[Dict]):
+        """Keyless fallback expander that always renders its body"""
+        with st.expander("🔍 Execution Details", expanded=False):
+            ChatUI._render_execution_steps(execution_details)
+
+    @staticmethod
+    def _render_execution_steps(execution_details: List[Dict]):
+        """Render the per-step breakdown of a chat turn"""
+        for i, detail in enumerate(execution_details):
+            st.write(f"**Step {i+1}: {detail['tool']}**")
+
+            if detail['tool'] == 'execute_sql':
+                ChatUI._display_sql_execution_enhanced(detail)
+
+            st.divider()
     
     @staticmethod
     def _display_sql_execution_enhanced(detail: Dict):
         """Enhanced SQL execution display with better table handling"""
         output = detail['output']
-        
-        if "QUERY:" in output and "RESULT:" in output:
-            parts = output.split("RESULT:", 1)
-            query_part = parts[0].replace("QUERY:", "").strip()
-            result_part = parts[1].strip()
-            
+
+        # Fast path: the executor attached the natively fetched rows with
+        # real column names, so no string re-parsing is needed
+        df = detail.get('df')
+        if df is not None:
+            st.write("**SQL Query:**")
+            st.code(detail['input'].get('query', 'Unknown query'), language="sql")
+            st.write("**Query Result:**")
+            ChatUI._display_dataframe(df, output)
+            return
+
+        m = _QUERY_RESULT_RE.search(output)
+        if m:
+            query_part = m.group(1).strip()
+            result_part = m.group(2).strip()
+
             st.write("**SQL Query:**")
             st.code(query_part, language="sql")
-            
+
             st.write("**Query Result:**")
-            
-            # Try to parse and display the result data
-            success = ChatUI._try_display_as_table(result_part)
-            
+
+            # Try to parse and display the result data (size-guarded)
+            success = len(result_part) <= _MAX_PARSE_LEN and \
+                ChatUI._try_display_as_table(result_part)
+
             if not success:
                 # Fallback to code display
-                st.code(result_part)
+                st.code(result_part[:_MAX_PARSE_LEN])
         else:
             # Fallback for other formats
             query = detail['input'].get('query', 'Unknown query')
@@ -197,77 +344,108 @@ class ChatUI:
     
     @staticmethod
     def _try_display_as_table(result_text: str) -> bool:
-        """Try to display result as a formatted table, return True if successful"""
+        """Try to display result as a formatted table, return True if successful.
+
+        Dispatches on the first character instead of chaining whole-string
+        `in`/`startswith` checks: each of those scanned the full payload,
+        which added up on multi-megabyte results.
+        """
         try:
-            # Strategy 1: Check if it's already a markdown table
-            if "|" in result_text and "Column_" in result_text:
-                lines = result_text.strip().split('\n')
-                if len(lines) >= 3:  # Header, separator, at least one data row
-                    st.markdown(result_text)
+            s = result_text.strip()
+            if not s:
+                return False
+
+            if s[0] == '[':
+                # List of tuples -> interactive DataFrame
+                if s[1:2] == '(' and s.endswith(")]"):
+                    try:
+                        # Cached across reruns; pagination clicks don't re-parse
+                        df = _parse_result_df(s)
+                        if df is not None:
+                            ChatUI._display_dataframe(df, s)
+                            return True
+                    except (ValueError, SyntaxError) as e:
+                        st.warning(f"Could not parse data: {e}")
+
+                # Plain list -> numbered markdown block
+                if s.endswith("]"):
+                    try:
+                        data = ast.literal_eval(s)
+                        if isinstance(data, list) and len(data) <= 20:  # Don't show huge lists
+                            # One markdown message instead of one per row
+                            st.markdown("\n".join(
+                                f"{i}. {item}" for i, item in enumerate(data, 1)
+                            ))
+                            return True
+                    except (ValueError, SyntaxError):
+                        pass
+                return False
+
+            # Pipe-separated / markdown table; only the prefix is scanned
+            # for the delimiter, the line check looks at the first 3 rows
+            if s[0] == '|' or '|' in s[:200]:
+                lines = s.split('\n')
+                if len(lines) >= 2 and all('|' in line for line in lines[:3] if line.strip()):
+                    st.markdown(s)
                     return True
-            
-            # Strategy 2: Try to parse as list of tuples and create DataFrame
-            if result_text.startswith("[(") and result_text.endswith(")]"):
-                try:
-                    # Clean and parse the data
-                    cleaned_data = ChatUI._clean_tuple_string(result_text)
-                    data = ast.literal_eval(cleaned_data)
-                    
-                    if isinstance(data, list) and data:
-                        # Create DataFrame
-                        df = pd.DataFrame(data)
-                        
-                        # Set generic column names
-                        df.columns = [f"Column_{i+1}" for i in range(len(df.columns))]
-                        
-                        # Display as interactive table
-                        st.dataframe(df, use_container_width=True)
-                        
-                        # Also display basic stats
-                        st.caption(f"📊 {len(df)} rows × {len(df.columns)} columns")
-                        return True
-                        
-                except (ValueError, SyntaxError) as e:
-                    st.warning(f"Could not parse data: {e}")
-            
-            # Strategy 3: Check for simple table format (pipe-separated)
-            lines = result_text.strip().split('\n')
-            if len(lines) >= 2 and all('|' in line for line in lines[:3] if line.strip()):
-                st.markdown(result_text)
-                return True
-            
-            # Strategy 4: Try to format as simple list if it looks like data
-            if result_text.startswith("[") and result_text.endswith("]"):
-                try:
-                    data = ast.literal_eval(result_text)
-                    if isinstance(data, list) and len(data) <= 20:  # Don't show huge lists
-                        for i, item in enumerate(data, 1):
-                            st.write(f"{i}. {item}")
-                        return True
-                except:
-                    pass
-            
+
             return False
-            
+
         except Exception as e:
             st.warning(f"Error displaying table: {e}")
             return False
     
+    # Rows rendered per page; larger frames are sliced so Streamlit only
+    # serializes one page over its protobuf channel instead of the whole frame
+    PAGE_SIZE = 100
+
+    @staticmethod
+    def _display_dataframe(df: pd.DataFrame, key_seed: str):
+        """Render a DataFrame, paginating large ones with a full-CSV download.
+
+        Widget keys derive from the result text; if the same result is
+        rendered twice in one run (chat body and the details expander),
+        the second render falls back to the first page without controls.
+        """
+        if len(df) <= ChatUI.PAGE_SIZE:
+            st.dataframe(df, use_container_width=True)
+            st.caption(f"📊 {len(df)} rows × {len(df.columns)} columns")
+            return
+
+        pages = -(-len(df) // ChatUI.PAGE_SIZE)
+        key = "tbl_" + hashlib.blake2b(key_seed.encode(), digest_size=6).hexdigest()
+        try:
+            page = st.number_input(
+                f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=key
+            )
+            start = (page - 1) * ChatUI.PAGE_SIZE
+            st.dataframe(df.iloc[start:start + ChatUI.PAGE_SIZE], use_container_width=True)
+            st.download_button(
+                "⬇️ Download full result (CSV)",
+                df.to_csv(index=False).encode(),
+                file_name="query_result.csv",
+                mime="text/csv",
+                key=key + "_dl",
+            )
+        except Exception:
+            # Duplicate widget key: same result already paginated elsewhere
+            st.dataframe(df.head(ChatUI.PAGE_SIZE), use_container_width=True)
+        st.caption(f"📊 {len(df)} rows × {len(df.columns)} columns")
+
     @staticmethod
     def _clean_tuple_string(data_str: str) -> str:
-        """Clean tuple string for parsing"""
+        """Clean tuple string for parsing (module-level compiled patterns)"""
         try:
-            # Handle Decimal objects
-            cleaned = re.sub(r"Decimal\('([^']+)'\)", r"float('\1')", data_str)
-            
+            # Decimal('1.5') -> 1.5 as a bare literal; the old float('...')
+            # rewrite produced a call ast.literal_eval refuses to evaluate
+            cleaned = _TUPLE_DECIMAL_RE.sub(r"\1", data_str)
+
             # Handle datetime objects - convert to string representation
-            cleaned = re.sub(r"datetime\.datetime\([^)]+\)", "'[DATETIME]'", cleaned)
-            
+            cleaned = _TUPLE_DATETIME_RE.sub("'[DATETIME]'", cleaned)
+
             # Handle any other objects that might cause issues
-            cleaned = re.sub(r"<[^>]+>", "'[OBJECT]'", cleaned)
-            
-            return cleaned
-            
+            return _TUPLE_OBJECT_RE.sub("'[OBJECT]'", cleaned)
+
         except Exception as e:
             st.warning(f"Error cleaning data string: {e}")
             return data_str
@@ -300,7 +478,9 @@ class ChatUI:
         with col4:
             if st.button("🗑️ Clear chat"):
                 st.session_state.messages = []
-                st.rerun()
+                # Re-render just the chat panel; the full-script rerun
+                # re-validated config and rebuilt the sidebar for nothing
+                st.rerun(scope="fragment")
         
         return None
     
@@ -330,20 +510,53 @@ class ChatUI:
         for detail in execution_details:
             if detail.get('tool') == 'execute_sql':
                 output = detail.get('output', '')
-                if "RESULT:" in output:
-                    result_part = output.split("RESULT:", 1)[1].strip()
-                    
-                    # Try to display as table in main chat area
-                    if ChatUI._try_display_as_table(result_part):
+                df = detail.get('df')
+                if df is not None:
+                    # Native rows attached by the executor; render directly
+                    ChatUI._display_dataframe(df, output)
+                    st.success("✅ Data displayed above")
+                    continue
+                result_part = extract_result_part(output)
+                if result_part is not None:
+                    # Huge payloads skip the parsers; trying to display
+                    # them as a table would hang the render
+                    if len(result_part) <= _MAX_PARSE_LEN and \
+                            ChatUI._try_display_as_table(result_part):
                         st.success("✅ Data displayed above")
                     else:
                         # If table display failed, show a sample of the data
                         st.info("📄 Raw data (first 200 characters):")
                         st.code(result_part[:200] + "..." if len(result_part) > 200 else result_part)
 
+@st.cache_resource(show_spinner=False)
+def _cached_connection(db_type: str, cfg_items: tuple):
+    """Create (or reuse) a SQLDatabase for a connection config.
+
+    Reconnecting to the same database within a session previously paid
+    the full TCP + auth handshake again; caching by (type, config) makes
+    it free. The schema fetch is already cached separately (see
+    agent.load_schema), keyed by the rendered URL.
+    """
+    config = dict(cfg_items)
+    if db_type == "SQLite":
+        return create_sqlite_connection(config["file_path"])
+    if db_type == "MySQL":
+        return create_mysql_connection(config)
+    return create_postgresql_connection(config)
+
 class ConnectionManager:
     """Handle database connections"""
-    
+
+    # Fields a server connection genuinely needs; port has a default and
+    # password may legitimately be empty (e.g. trust auth), so requiring
+    # every value just forced needless re-entry and reconnect attempts
+    _REQUIRED_FIELDS = ('host', 'user', 'database')
+
+    @staticmethod
+    def _missing_required(connection_config: Dict) -> bool:
+        return not all(connection_config.get(k)
+                       for k in ConnectionManager._REQUIRED_FIELDS)
+
     @staticmethod
     def attempt_connection(db_type: str, connection_config: Dict, groq_api_key: str) -> bool:
         """Attempt to connect to database"""
@@ -355,34 +568,43 @@ class ConnectionManager:
                         st.error("Please provide a valid SQLite database file")
                         return False
                     
-                    db = DatabaseConfig.create_sqlite_connection(db_file_path)
+                    db = _cached_connection(
+                        db_type, (("file_path", db_file_path),)
+                    )
                     st.session_state.agent = SQLAgent(db, groq_api_key)
                     st.session_state.db_connected = True
-                    st.session_state.db_schema = db.get_table_info()
+                    # Reuse the schema the agent already fetched (cached)
+                    st.session_state.db_schema = st.session_state.agent.schema
                     st.success("Connected to SQLite database!")
                     return True
                 
                 elif db_type == "MySQL":
-                    if not all(connection_config.values()):
-                        st.error("Please fill in all MySQL connection details")
+                    if ConnectionManager._missing_required(connection_config):
+                        st.error("Please fill in the MySQL host, username and database")
                         return False
                     
-                    db = DatabaseConfig.create_mysql_connection(connection_config)
+                    db = _cached_connection(
+                        db_type, tuple(sorted(connection_config.items()))
+                    )
                     st.session_state.agent = SQLAgent(db, groq_api_key)
                     st.session_state.db_connected = True
-                    st.session_state.db_schema = db.get_table_info()
+                    # Reuse the schema the agent already fetched (cached)
+                    st.session_state.db_schema = st.session_state.agent.schema
                     st.success("Connected to MySQL database!")
                     return True
                 
                 elif db_type == "PostgreSQL":
-                    if not all(connection_config.values()):
-                        st.error("Please fill in all PostgreSQL connection details")
+                    if ConnectionManager._missing_required(connection_config):
+                        st.error("Please fill in the PostgreSQL host, username and database")
                         return False
                     
-                    db = DatabaseConfig.create_postgresql_connection(connection_config)
+                    db = _cached_connection(
+                        db_type, tuple(sorted(connection_config.items()))
+                    )
                     st.session_state.agent = SQLAgent(db, groq_api_key)
                     st.session_state.db_connected = True
-                    st.session_state.db_schema = db.get_table_info()
+                    # Reuse the schema the agent already fetched (cached)
+                    st.session_state.db_schema = st.session_state.agent.schema
                     st.success("Connected to PostgreSQL database!")
                     return True
         
@@ -400,6 +622,6 @@ class ConnectionManager:
         st.session_state.agent = None
         st.session_state.db_schema = None
         st.session_state.messages = []
-        st.session_state.query_logs = []
+        st.session_state.query_logs = deque(maxlen=50)
         st.success("Disconnected from database")
         st.rerun()
\ No newline at end of file